@@ -3,14 +3,30 @@ import cProfile
 import pstats
 from io import StringIO
 from os import path
+from typing import Optional
 
-import pandas as pd
-
-from sattools.solvers import DPLL
+from sattools.instrumentation import Metrics, print_progress
+from sattools.localsearch import LocalSearch
+from sattools.portfolio import describe_configuration, parse_configuration
+from sattools.solvers import DPLL, get_available_solvers, get_solver
 from sattools.utils import read_dimacs, write_dimacs
 
 
-def main(filepath: str, heuristic: str, runs: int, profile: bool):
+def main(
+    filepath: str,
+    heuristic: str,
+    runs: int,
+    profile: bool,
+    engine: str,
+    solver: str,
+    backend: str,
+    portfolio: Optional[str] = None,
+    metrics: bool = False,
+    trace_memory: bool = False,
+    preprocess_cnf: bool = False,
+    max_models: int = 1,
+    algorithm: str = "probsat",
+):
     # Get filename without extension
     filename, _ = path.splitext(filepath)
 
@@ -24,8 +40,38 @@ def main(filepath: str, heuristic: str, runs: int, profile: bool):
 
     stats = []
 
+    # Heuristic, engine and backend only apply to DPLL
+    solver_class = get_solver(solver)
+    solver_kwargs = {}
+    if solver == "dpll":
+        solver_kwargs = dict(heuristic=heuristic, engine=engine, backend=backend)
+    elif solver == "portfolio" and portfolio:
+        # The engine and backend apply to every DPLL configuration
+        configurations = [
+            parse_configuration(text, engine=engine, backend=backend)
+            for text in portfolio.split(",")
+        ]
+        solver_kwargs = dict(configurations=configurations)
+    elif solver == "localsearch":
+        solver_kwargs = dict(algorithm=algorithm)
+    elif solver == "cubes":
+        # The cubes are conquered by DPLL with the given options
+        solver_kwargs = dict(
+            conquer_kwargs=dict(heuristic=heuristic, engine=engine, backend=backend)
+        )
+    if preprocess_cnf:
+        solver_kwargs["preprocess"] = True
+    if max_models != 1:
+        # 0 counts all models
+        assert solver == "cdcl", "counting models requires --solver cdcl"
+        solver_kwargs["max_models"] = max_models or None
+
     for i in range(runs):
-        dpll = DPLL(cnf, verbose=True, heuristic=heuristic)
+        # Verbose solvers print their progress, these metrics also go in the stats
+        run_metrics = None
+        if metrics or trace_memory:
+            run_metrics = Metrics(progress=print_progress, trace_memory=trace_memory)
+        dpll = solver_class(cnf, verbose=True, metrics=run_metrics, **solver_kwargs)
         dpll.solve()
 
         # Feedback about solution
@@ -40,6 +86,16 @@ def main(filepath: str, heuristic: str, runs: int, profile: bool):
             propagations=dpll.propagation_count,
             duration=round(dpll.solve_duration, 2),
         )
+        if run_metrics is not None:
+            # Peak memory is None when not traced
+            measured = run_metrics.as_dict().items()
+            run_stats.update({key: value for key, value in measured if value is not None})
+        if max_models != 1:
+            run_stats["models"] = len(dpll.models)
+        if dpll.preprocessor is not None:
+            run_stats.update(dpll.preprocessor.stats)
+        if solver == "portfolio" and dpll.winner is not None:
+            run_stats["winner"] = describe_configuration(dpll.winner)
         stats.append(run_stats)
         print(f"stats: {run_stats}")
 
@@ -55,24 +111,118 @@ def main(filepath: str, heuristic: str, runs: int, profile: bool):
             f.write(stream.getvalue())
 
     if runs > 1:
+        # Imported here as pandas is an optional requirement, and slow to import
+        import pandas as pd
+
         df = pd.DataFrame(stats)
         print(df.agg(["mean", "std", "max"]))
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run SAT solver")
-    parser.add_argument("file", type=str, help="Filepath to dimacs to solve")
+    parser.add_argument("file", type=str, nargs="?", help="Filepath to dimacs to solve")
+    parser.add_argument(
+        "--solver",
+        default="dpll",
+        help=f"The solver to use, one of {list(get_available_solvers())}",
+    )
     parser.add_argument(
         "--heuristic",
         default="random",
         help=f"The heuristic to use, one of {DPLL.get_available_heuristics()}",
     )
+    parser.add_argument(
+        "--engine",
+        default="simplify",
+        help=f"The propagation engine to use, one of {DPLL.get_available_engines()}",
+    )
+    parser.add_argument(
+        "--backend",
+        default="sets",
+        help=f"The cnf representation to use, one of {DPLL.get_available_backends()}",
+    )
+    parser.add_argument(
+        "--algorithm",
+        default="probsat",
+        help="The local search algorithm, one of "
+        f"{LocalSearch.get_available_algorithms()}",
+    )
+    parser.add_argument(
+        "--portfolio",
+        default=None,
+        help="Configurations raced by the portfolio solver, e.g. cdcl,jw,random:1",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Report time spent per phase, decisions, conflicts, depth and cnf size",
+    )
+    parser.add_argument(
+        "--trace_memory",
+        action="store_true",
+        help="Also report the peak memory, which slows the solver down",
+    )
+    parser.add_argument(
+        "--preprocess_cnf",
+        action="store_true",
+        help="Simplify the cnf by subsumption, probing and variable elimination",
+    )
+    parser.add_argument(
+        "--max_models",
+        default=1,
+        type=int,
+        help="Count models up to this many with cdcl, 2 checks uniqueness, 0 all",
+    )
     parser.add_argument(
         "--runs", default=1, type=int, help="Run the solver multiple times",
     )
     parser.add_argument(
         "--profile", action="store_true", help="Enable cProfiler and store to file"
     )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Keep running and solve json requests from stdin or the socket",
+    )
+    parser.add_argument(
+        "--socket", default=None, help="Unix socket to serve on instead of stdin"
+    )
+    parser.add_argument(
+        "--workers", default=None, type=int, help="Solver processes when serving"
+    )
 
     args = parser.parse_args()
-    main(args.file, args.heuristic, args.runs, args.profile)
+    if args.serve:
+        # Imported here as only the server needs asyncio
+        from sattools.server import SolverServer
+
+        # The options given are the defaults of every request
+        defaults = dict(
+            solver=args.solver,
+            heuristic=args.heuristic,
+            engine=args.engine,
+            backend=args.backend,
+            algorithm=args.algorithm,
+            max_models=args.max_models,
+            metrics=args.metrics,
+        )
+        SolverServer(workers=args.workers, defaults=defaults).run(args.socket)
+        parser.exit()
+    if args.file is None:
+        parser.error("the file is required unless serving")
+
+    main(
+        args.file,
+        args.heuristic,
+        args.runs,
+        args.profile,
+        args.engine,
+        args.solver,
+        args.backend,
+        args.portfolio,
+        args.metrics,
+        args.trace_memory,
+        args.preprocess_cnf,
+        args.max_models,
+        args.algorithm,
+    )
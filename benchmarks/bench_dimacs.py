@@ -0,0 +1,95 @@
+import argparse
+import gzip
+import random
+import sys
+import tempfile
+from os import path
+from time import perf_counter
+from typing import Callable, List, Set
+
+# Allow running as `python benchmarks/bench_dimacs.py` from the repository root
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from sattools.utils import read_dimacs  # noqa: E402
+
+
+def read_dimacs_previous(filepath: str) -> List[Set[int]]:
+    """The reader as it was before streaming, kept for comparison."""
+    with open(filepath, encoding="UTF-8") as f:
+        dimacs_lines = f.read().splitlines()
+
+    clause_list = []
+    for row in dimacs_lines:
+        if row[0] in ("c", "p"):
+            ...
+        else:
+            row = row.rstrip("0")
+            row = row.strip()
+            clauses = row.split(" ")
+            clauses_int = {int(i) for i in clauses}
+            clause_list.append(clauses_int)
+
+    return clause_list
+
+
+def write_random_cnf(filepath: str, variables: int, clauses: int, seed: int = 0):
+    """Write a random 3-SAT instance, gzipped when the path ends with .gz"""
+    rng = random.Random(seed)
+    opener = gzip.open if filepath.endswith(".gz") else open
+
+    with opener(filepath, "wt") as f:  # type: ignore
+        f.write(f"c random 3-SAT, seed {seed}\n")
+        f.write(f"p cnf {variables} {clauses}\n")
+        for _ in range(clauses):
+            clause = rng.sample(range(1, variables + 1), 3)
+            line = " ".join(str(v if rng.random() < 0.5 else -v) for v in clause)
+            f.write(f"{line} 0\n")
+
+
+def timeit(func: Callable, filepath: str, repeat: int) -> float:
+    """Best time out of `repeat` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func(filepath)
+        best = min(best, perf_counter() - start)
+
+    return best
+
+
+def main(variables: int, clauses: int, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        plain = path.join(directory, "random.cnf")
+        compressed = path.join(directory, "random.cnf.gz")
+        write_random_cnf(plain, variables, clauses)
+        write_random_cnf(compressed, variables, clauses)
+
+        size = path.getsize(plain) / 2 ** 20
+        print(f"{clauses} clauses, {variables} variables, {size:.1f} MB")
+
+        readers = {
+            "previous read_dimacs": (read_dimacs_previous, plain),
+            "read_dimacs": (read_dimacs, plain),
+            "read_dimacs (.gz)": (read_dimacs, compressed),
+        }
+
+        try:
+            from sattools.compact import CompactCNF
+
+            readers["CompactCNF.from_dimacs"] = (CompactCNF.from_dimacs, plain)
+        except ImportError:
+            print("numpy is not installed, skipping CompactCNF")
+
+        for name, (func, filepath) in readers.items():
+            duration = timeit(func, filepath, repeat)
+            print(f"{name:>24}: {duration:6.2f}s, {size / duration:6.1f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the DIMACS readers")
+    parser.add_argument("--variables", default=100_000, type=int)
+    parser.add_argument("--clauses", default=500_000, type=int)
+    parser.add_argument("--repeat", default=3, type=int, help="Best of n runs")
+
+    args = parser.parse_args()
+    main(args.variables, args.clauses, args.repeat)
@@ -0,0 +1,289 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime
+from math import exp, lgamma, log, sqrt
+from os import path
+from statistics import mean, variance
+from time import perf_counter
+from timeit import Timer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Allow running as `python benchmarks/bench_suite.py` from the repository root
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sattools.collection import EncodedCollection  # noqa: E402
+from sattools.solvers import DPLL, Solver  # noqa: E402
+from sattools.sudoku import Sudoku, get_rules_filepath  # noqa: E402
+from sattools.utils import read_dimacs, timed_solve  # noqa: E402
+
+Samples = Dict[str, List[float]]
+
+# Name, collection and grid size of the sudoku benchmarks
+COLLECTIONS = {
+    "4x4": ("test_sudokus/4x4.txt", 4),
+    "top95": ("test_sudokus/top95.sdk.txt", 9),
+    "damnhard": ("test_sudokus/damnhard.sdk.txt", 9),
+    "16x16": ("test_sudokus/16x16.txt", 16),
+}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.stdout.strip()
+
+
+def measure_solve(solver: Solver, timeout: Optional[float]) -> Tuple[float, bool]:
+    """Duration of a solve and whether it finished within the timeout"""
+    start = perf_counter()
+    finished = timed_solve(solver, timeout)
+
+    return perf_counter() - start, finished
+
+
+def bench_sudokus(
+    collections: List[str],
+    heuristics: List[str],
+    n: int,
+    seed: int,
+    timeout: Optional[float],
+) -> Samples:
+    """Solve time of every puzzle in a seeded subset of each collection. Solves
+    that time out count as the timeout, which only underestimates slowdowns."""
+    samples: Samples = {}
+
+    for name in collections:
+        filepath, size = COLLECTIONS[name]
+        sudokus = EncodedCollection(path.join(ROOT, filepath), size=size)
+        subset = random.Random(seed).sample(sudokus, min(n, len(sudokus)))
+
+        for heuristic in heuristics:
+            durations = []
+            timeouts = 0
+
+            for number, sudoku in enumerate(subset):
+                # Same choices for the random heuristics on every run
+                random.seed(seed + number)
+                cnf = Sudoku(sudoku, f"{size}x{size}").get_all_clauses()
+                solver = DPLL(cnf, heuristic=heuristic)
+                duration, finished = measure_solve(solver, timeout)
+                durations.append(duration)
+                timeouts += not finished
+
+            key = f"sudoku/{name}/{heuristic}"
+            samples[key] = durations
+            print(f"{key:>32}: {mean(durations):8.4f}s, {timeouts} timeouts")
+
+    return samples
+
+
+def bench_primitives(repeat: int, seed: int) -> Samples:
+    """Time per call of the cnf operations DPLL spends its time in"""
+    random.seed(seed)
+    sudoku = EncodedCollection(path.join(ROOT, COLLECTIONS["top95"][0]))[0]
+    cnf = Sudoku(sudoku).get_all_clauses()
+    literal = next(iter(sudoku[0]))
+    rules = get_rules_filepath("9x9")
+
+    primitives: Dict[str, Callable] = {
+        "simplify": lambda: Solver.simplify(cnf),
+        "remove_literal": lambda: Solver.remove_literal(cnf, literal),
+        "read_dimacs": lambda: read_dimacs(rules),
+    }
+    for heuristic in DPLL.get_available_heuristics(post=False):
+        function = getattr(Solver, f"get_literal_{heuristic}")
+        primitives[f"get_literal_{heuristic}"] = lambda function=function: function(
+            cnf
+        )
+
+    samples: Samples = {}
+    for name, function in primitives.items():
+        timer = Timer(function)
+        # Enough calls per sample to make the clock resolution irrelevant
+        number, _ = timer.autorange()
+        samples[f"primitive/{name}"] = [
+            duration / number for duration in timer.repeat(repeat, number)
+        ]
+        print(f"{name:>32}: {mean(samples[f'primitive/{name}']) * 1e3:8.3f}ms")
+
+    return samples
+
+
+def betainc(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta function, by its continued fraction"""
+    if x <= 0 or x >= 1:
+        return max(0.0, min(1.0, x))
+
+    # The continued fraction converges quickly on this side only
+    if x > (a + 1) / (a + b + 2):
+        return 1 - betainc(b, a, 1 - x)
+
+    front = exp(
+        lgamma(a + b) - lgamma(a) - lgamma(b) + a * log(x) + b * log(1 - x)
+    ) / a
+
+    tiny = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, 200):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+        if abs(c * d - 1) < 1e-12:
+            break
+
+    return front * fraction
+
+
+def welch(before: List[float], after: List[float]) -> Tuple[float, float]:
+    """Welch's t-test, returns t and the one-sided p-value of `after` being
+    slower than `before`"""
+    var_before = variance(before) / len(before) if len(before) > 1 else 0.0
+    var_after = variance(after) / len(after) if len(after) > 1 else 0.0
+    difference = mean(after) - mean(before)
+
+    if var_before + var_after == 0:
+        # No spread at all, any difference is certain
+        return 0.0, 0.0 if difference > 0 else 1.0
+
+    t = difference / sqrt(var_before + var_after)
+    df = (var_before + var_after) ** 2 / (
+        (var_before ** 2 / (len(before) - 1) if len(before) > 1 else 0)
+        + (var_after ** 2 / (len(after) - 1) if len(after) > 1 else 0)
+    )
+
+    # Tail of the t-distribution through the incomplete beta function
+    tail = 0.5 * betainc(df / 2, 0.5, df / (df + t ** 2))
+    p = tail if t > 0 else 1 - tail
+
+    return t, p
+
+
+def compare(baseline: str, current: str, alpha: float, threshold: float) -> bool:
+    """Print the change of every benchmark in both files, returns True when
+    any got significantly slower by more than the threshold"""
+    with open(baseline) as f:
+        before = json.load(f)
+    with open(current) as f:
+        after = json.load(f)
+
+    print(f"{before['commit']} ({before['date']})", end=" -> ")
+    print(f"{after['commit']} ({after['date']})")
+
+    regressed = False
+    for name, samples in after["results"].items():
+        if name not in before["results"]:
+            continue
+
+        old = before["results"][name]
+        change = mean(samples) / mean(old) - 1
+        t, p = welch(old, samples)
+
+        slower = p < alpha and change > threshold
+        regressed |= slower
+        flag = "SLOWER" if slower else ""
+        print(f"{name:>32}: {change:+8.1%}, t = {t:6.2f}, p = {p:.4f} {flag}")
+
+    return regressed
+
+
+def run(args) -> None:
+    results: Samples = {}
+    if not args.skip_primitives:
+        results.update(bench_primitives(args.repeat, args.seed))
+    if not args.skip_sudokus:
+        heuristics = args.heuristics or DPLL.get_available_heuristics(post=False)
+        results.update(
+            bench_sudokus(args.collections, heuristics, args.n, args.seed, args.timeout)
+        )
+
+    baseline = dict(
+        commit=git_commit(),
+        date=datetime.now().isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        seed=args.seed,
+        results=results,
+    )
+
+    with open(args.output, "w") as f:
+        json.dump(baseline, f, indent=1)
+    print(f"Stored in {args.output}")
+
+    if args.baseline:
+        sys.exit(compare(args.baseline, args.output, args.alpha, args.threshold))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the solver and flag slowdowns against a baseline"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runner = commands.add_parser("run", help="Run the benchmarks and store as json")
+    runner.add_argument("output", help="Json file to store the results in")
+    runner.add_argument(
+        "--baseline", default=None, help="Json of an earlier run to compare with"
+    )
+    runner.add_argument(
+        "--collections",
+        default=list(COLLECTIONS),
+        nargs="+",
+        choices=list(COLLECTIONS),
+        help="Sudoku collections to solve",
+    )
+    runner.add_argument(
+        "--heuristics", default=None, nargs="+", help="Heuristics, default all"
+    )
+    runner.add_argument("--n", default=5, type=int, help="Sudokus per collection")
+    runner.add_argument("--seed", default=0, type=int)
+    runner.add_argument(
+        "--timeout", default=60, type=float, help="Seconds before a solve is cut off"
+    )
+    runner.add_argument(
+        "--repeat", default=7, type=int, help="Samples per primitive"
+    )
+    runner.add_argument("--skip_sudokus", action="store_true")
+    runner.add_argument("--skip_primitives", action="store_true")
+
+    comparer = commands.add_parser("compare", help="Compare two stored runs")
+    comparer.add_argument("baseline", help="Json of the earlier run")
+    comparer.add_argument("current", help="Json of the later run")
+
+    for command in (runner, comparer):
+        command.add_argument(
+            "--alpha", default=0.01, type=float, help="Significance level"
+        )
+        command.add_argument(
+            "--threshold",
+            default=0.05,
+            type=float,
+            help="Relative slowdown that is ignored, even when significant",
+        )
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args.baseline, args.current, args.alpha, args.threshold))
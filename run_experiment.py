@@ -1,16 +1,27 @@
 import argparse
-from concurrent.futures import TimeoutError
+import csv
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, TimeoutError, wait
+from contextlib import ExitStack
+from itertools import chain, islice
 from multiprocessing import cpu_count, freeze_support
-from os import path
-from typing import Optional
+from os import fsync, path, remove
+from time import time
+from typing import TYPE_CHECKING, Any
+from typing import Counter as CounterType
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
 
-import pandas as pd
-from pebble import ProcessPool
+from pebble import ProcessFuture, ProcessPool
 from pebble.common import ProcessExpired
 
-from sattools.solvers import DPLL
-from sattools.sudoku import Sudoku
-from sattools.utils import read_sudoku_collections
+from sattools.collection import EncodedCollection
+from sattools.instrumentation import Metrics
+from sattools.solvers import CDCL, Solver, get_solver
+from sattools.sudoku import Sudoku, get_encoder, load_rules
+from sattools.utils import CNFtype
+
+if TYPE_CHECKING:
+    from sattools.compact import SharedCNF
 
 
 def main(
@@ -20,77 +31,350 @@ def main(
     repeat: int = 1,
     n_max: Optional[int] = None,
     ids_path: Optional[str] = None,
+    engine: str = "simplify",
+    solver: str = "dpll",
+    backend: str = "sets",
+    preprocess: bool = False,
+    shared_rules: bool = False,
+    resume: bool = False,
+    metrics: bool = False,
+    trace_memory: bool = False,
+    preprocess_cnf: bool = False,
+    incremental: bool = False,
+    max_models: int = 1,
+    algorithm: str = "probsat",
 ):
     # Grid as a string
     grid = f"{grid_size}x{grid_size}"
 
-    # Get external ids
-    if ids_path:
-        with open(ids_path) as f:
-            ids = f.read().splitlines()
-
-    # Construct sudokus
-    sudokus_collection = read_sudoku_collections(collection, size=grid_size)[:n_max]
-    sudokus = [Sudoku(sudoku, grid) for sudoku in sudokus_collection]
-    # Make an iterator to construct DPLL solvers, zip with ids if available otherwise just enumerate
-    sudokus_iter = zip(ids, sudokus) if ids_path else enumerate(sudokus)
-    # Construct solvers
-    solvers = [
-        DPLL(sudoku.get_all_clauses(), heuristic=heuristic, identifier=identifier,)
-        for identifier, sudoku in sudokus_iter
-    ]
-    # Run every multiple times
-    solvers = solvers * repeat
-
-    stats_collection = []
-    timeouts = 0
-    print(f"Solving {len(solvers)} sudokus, {heuristic = }, n threads = {cpu_count()}")
-
-    # Enable multiprocessing through Pebble
-    with ProcessPool() as pool:
-        future = pool.map(solve_sudoku, solvers, timeout=600)
-        iterator = future.result()
+    # Heuristic, engine and backend only apply to DPLL
+    solver_kwargs = {}
+    if solver == "dpll":
+        solver_kwargs = dict(heuristic=heuristic, engine=engine, backend=backend)
+    elif solver == "localsearch":
+        solver_kwargs = dict(algorithm=algorithm)
+    if preprocess_cnf:
+        solver_kwargs["preprocess"] = True
+    if max_models != 1:
+        # Models are counted on the cells, 0 counts all of them
+        assert solver == "cdcl", "counting models requires --solver cdcl"
+        solver_kwargs["max_models"] = max_models or None
+        solver_kwargs["projection"] = get_encoder(grid).variables()
+    # Everything a worker needs to build the puzzle and its solver
+    settings = dict(
+        grid=grid,
+        solver=solver,
+        solver_kwargs=solver_kwargs,
+        preprocess=preprocess,
+        metrics=metrics or trace_memory,
+        trace_memory=trace_memory,
+    )
+    if incremental:
+        assert solver == "cdcl", "incremental solving requires --solver cdcl"
+        assert not (preprocess or preprocess_cnf), "incremental solves the rules"
+        settings["incremental"] = True
+
+    # Other solvers than DPLL are named after the solver instead of the heuristic,
+    # local search after its algorithm
+    label = heuristic if solver == "dpll" else solver
+    if solver == "localsearch":
+        label = algorithm
+    filename, _ = path.splitext(path.basename(collection))
+    outfile = "_".join([grid, label, filename])
+
+    n_workers = cpu_count()
+    print(f"Solving sudokus from {collection}, {label = }, n threads = {n_workers}")
+
+    with ExitStack() as stack:
+        # Results are written as they come in, so an interrupted run keeps them
+        writer = stack.enter_context(
+            ResultWriter(
+                f"experiments/{outfile}.csv",
+                f"experiments/{outfile}_timeouts.txt",
+                resume=resume,
+            )
+        )
+
+        # The collection is only parsed on its first run, later runs map the
+        # encoded givens from disk and read them one at a time
+        sudokus = stack.enter_context(EncodedCollection(collection, size=grid_size))
+        puzzles = chain.from_iterable(
+            iter_puzzles(sudokus, n_max, ids_path) for _ in range(repeat)
+        )
+        if resume:
+            puzzles = skip_done(puzzles, writer.done())
+
+        if shared_rules:
+            # Imported here as numpy is an optional requirement
+            from sattools.compact import SharedCNF
+
+            # Workers attach to this single copy instead of loading the rules
+            rules = load_rules(grid, persist=True)
+            settings["shared_rules"] = stack.enter_context(SharedCNF.create(rules))
+
+        # Enable multiprocessing through Pebble
+        pool = stack.enter_context(ProcessPool(max_workers=n_workers))
+        # Only a few puzzles per worker are scheduled at once, so memory use
+        # does not depend on the size of the collection. The window is refilled
+        # as soon as any puzzle finishes, so a hard one doesn't idle the others
+        pending: Dict[ProcessFuture, Any] = {}
+        puzzles = iter(puzzles)
 
         while True:
-            try:
-                result = next(iterator)
-                stats_collection.append(result)
-                print(result)
-            except StopIteration:
+            for puzzle in islice(puzzles, 2 * n_workers - len(pending)):
+                future = pool.schedule(solve_puzzle, (puzzle,), settings, timeout=600)
+                pending[future] = puzzle[0]
+
+            if not pending:
                 break
-            except TimeoutError as error:
-                timeouts += 1
-                print("Timeout")
-            except ProcessExpired as error:
-                print("Process expired")
-            except Exception as error:
-                print("function raised %s" % error)
-                print(error.traceback)
-
-    # Gather statistic to a dataframe so it can be easily written as csv
-    dataframe = pd.DataFrame(stats_collection)
-    filename, _ = path.splitext(path.basename(collection))
-    outfile = "_".join([grid, heuristic, filename])
-    dataframe.to_csv(f"experiments/{outfile}.csv", index=False)
 
-    if timeouts > 0:
-        with open(f"experiments/{outfile}_timeouts.txt", "w") as f:
-            f.write(str(timeouts))
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                write_outcome(writer, pool, pending.pop(future), future)
+
+
+def write_outcome(
+    writer: "ResultWriter", pool: ProcessPool, identifier: Any, future: ProcessFuture
+) -> None:
+    """Write the result of a finished puzzle, or why it failed"""
+    try:
+        result = future.result()
+    except TimeoutError as error:
+        writer.write_failure(identifier, "timeout")
+        print("Timeout")
+    except ProcessExpired as error:
+        writer.write_failure(identifier, "expired")
+        print("Process expired")
+    except Exception as error:
+        print("function raised %s" % error)
+        print(error.traceback)
+    else:
+        try:
+            writer.write(result)
+        except ValueError:
+            # Not waiting for the puzzles that are still scheduled
+            pool.stop()
+            raise
+        print(result)
+
+
+class ResultWriter:
+    """Appends results to a csv as they arrive, the failed identifiers go to a
+    separate file with one `identifier,reason` per line. Writes are flushed
+    right away and synced to disk every `sync_interval` seconds."""
+
+    def __init__(
+        self,
+        filepath: str,
+        failures_filepath: str,
+        resume: bool = False,
+        sync_interval: float = 5.0,
+    ) -> None:
+        self.filepath = filepath
+        self.failures_filepath = failures_filepath
+        self.sync_interval = sync_interval
+
+        # A new run starts from scratch, resuming appends to the files
+        mode = "a" if resume else "w"
+        self.file = open(filepath, mode + "+", newline="")
+        self.failures_file = open(failures_filepath, mode + "+")
+
+        # The header of an existing csv decides the order of the columns
+        self.file.seek(0)
+        self.fieldnames = next(csv.reader(self.file), None)
+        self.writer: Optional[csv.DictWriter] = None
+        self.last_sync = time()
+
+    def done(self) -> CounterType[str]:
+        """How many times every identifier has already been run"""
+        self.file.seek(0)
+        self.failures_file.seek(0)
+
+        done = Counter(row["identifier"] for row in csv.DictReader(self.file))
+        done.update(line.split(",")[0] for line in self.failures_file if line.strip())
+
+        return done
+
+    def write(self, result: Dict[str, Any]) -> None:
+        if self.writer is None:
+            if self.fieldnames is None:
+                self.fieldnames = list(result)
+                csv.writer(self.file).writerow(self.fieldnames)
+            elif set(result) != set(self.fieldnames):
+                # E.g. resumed with other --metrics, --preprocess_cnf or
+                # --max_models, checked before anything is appended
+                missing = [key for key in self.fieldnames if key not in result]
+                extra = [key for key in result if key not in self.fieldnames]
+                raise ValueError(
+                    f"Can't resume {self.filepath}, its columns differ from "
+                    f"the results of this run (missing {missing}, extra "
+                    f"{extra}). Resume with the options of the earlier run."
+                )
+            self.writer = csv.DictWriter(self.file, self.fieldnames)
+
+        self.writer.writerow(result)
+        self.flush(self.file)
+
+    def write_failure(self, identifier: Any, reason: str) -> None:
+        self.failures_file.write(f"{identifier},{reason}\n")
+        self.flush(self.failures_file)
+
+    def flush(self, file: TextIO) -> None:
+        file.flush()
+        if time() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        for file in (self.file, self.failures_file):
+            file.flush()
+            fsync(file.fileno())
+        self.last_sync = time()
+
+    def close(self) -> None:
+        self.sync()
+        self.file.close()
+        self.failures_file.close()
+
+        # No failures, no file
+        if path.getsize(self.failures_filepath) == 0:
+            remove(self.failures_filepath)
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def skip_done(
+    puzzles: Iterable[Tuple[Any, CNFtype]], done: CounterType[str]
+) -> Iterator[Tuple[Any, CNFtype]]:
+    """Leave out the puzzles that were already run, as often as they were run"""
+    for puzzle in puzzles:
+        identifier = str(puzzle[0])
+        if done[identifier] > 0:
+            done[identifier] -= 1
+            continue
+
+        yield puzzle
+
+
+def iter_puzzles(
+    collection: Sequence[CNFtype],
+    n_max: Optional[int] = None,
+    ids_path: Optional[str] = None,
+) -> Iterator[Tuple[Any, CNFtype]]:
+    """Lazily pair the givens of every sudoku with its identifier, which are
+    taken from the ids file if available otherwise just enumerated"""
+    sudokus = islice(collection, n_max)
+
+    if not ids_path:
+        yield from enumerate(sudokus)
+        return
+
+    with open(ids_path) as f:
+        yield from zip((line.rstrip("\r\n") for line in f), sudokus)
 
 
-def solve_sudoku(dpll: DPLL):
-    dpll.solve()
+def solve_puzzle(
+    puzzle: Tuple[Any, CNFtype],
+    grid: str,
+    solver: str,
+    solver_kwargs: Dict[str, Any],
+    preprocess: bool = False,
+    shared_rules: Optional["SharedCNF"] = None,
+    metrics: bool = False,
+    trace_memory: bool = False,
+    incremental: bool = False,
+):
+    """Build the sudoku and its solver from the givens, inside the worker"""
+    identifier, givens = puzzle
+    run_metrics = Metrics(trace_memory=trace_memory) if metrics else None
+
+    if incremental:
+        # The givens are assumptions for the solver this worker keeps
+        dpll = get_incremental_solver(grid, solver_kwargs)
+        dpll.identifier = identifier
+        dpll.metrics = run_metrics
+        assumptions = [literal for clause in givens for literal in clause]
+
+        return solve_sudoku(dpll, assumptions=assumptions)
+
+    sudoku = Sudoku(
+        givens,
+        grid,
+        persist_rules=True,
+        preprocess=preprocess,
+        shared_rules=shared_rules,
+    )
+    dpll = get_solver(solver)(
+        sudoku.get_all_clauses(),
+        identifier=identifier,
+        metrics=run_metrics,
+        **solver_kwargs,
+    )
+
+    return solve_sudoku(dpll, sudoku)
+
+
+# Solvers kept by a worker process across puzzles, by grid
+_incremental: Dict[str, CDCL] = {}
+
+
+def get_incremental_solver(grid: str, solver_kwargs: Dict[str, Any]) -> CDCL:
+    """The rules are loaded into a solver once per worker, which then keeps
+    its learned clauses from one puzzle to the next"""
+    if grid not in _incremental:
+        _incremental[grid] = CDCL(load_rules(grid, persist=True), **solver_kwargs)
+
+    return _incremental[grid]
+
+
+def solve_sudoku(
+    dpll: Solver,
+    sudoku: Optional[Sudoku] = None,
+    assumptions: Optional[List[int]] = None,
+):
+    if assumptions is None:
+        dpll.solve()
+    else:
+        dpll.solve(assumptions)
+    if sudoku is not None:
+        # Givens applied to shared rules are not part of the solver's cnf
+        dpll.set_solution(sudoku.complete_solution(dpll.solution))
     stats = dict(
         identifier=dpll.identifier,
         backtracks=dpll.backtrack_count,  # n backtracks
         propagations=dpll.propagation_count,  # n propagations
         duration=dpll.solve_duration,  # duration in seconds
         constraint_size=len(
-            dpll.determine_unit_clauses(dpll.cnf)
+            sudoku.constraints
+            if sudoku is not None
+            else assumptions
+            if assumptions is not None
+            else dpll.determine_unit_clauses(dpll.cnf)
         ),  # size of original sudoku
         assignment_size=len(dpll.solution),  # size of final assignment
         satisfied=dpll.satisfied,  # true or false if satisfied
+        # Same as the server, unknown when an incomplete solver gave up
+        status="satisfied"
+        if dpll.satisfied
+        else "unsatisfied"
+        if dpll.complete
+        else "unknown",
+        fixed_cells=sudoku.fixed_count
+        if sudoku is not None
+        else 0,  # cells filled in by preprocessing
     )
+    # Timers, counters and peak sizes, if they were kept track of
+    if dpll.metrics is not None:
+        stats.update(dpll.metrics.as_dict())
+    # Models found up to the maximum, 1 for a unique solution
+    if getattr(dpll, "max_models", 1) != 1:
+        stats["models"] = len(dpll.models)
+    # Reductions of the cnf preprocessing, if it was applied
+    if dpll.preprocessor is not None:
+        stats.update(dpll.preprocessor.stats)
 
     return stats
 
@@ -98,9 +382,63 @@ def solve_sudoku(dpll: DPLL):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run SAT solving experiment")
     parser.add_argument("collection", help="Filepath to collection of sudokus")
+    parser.add_argument(
+        "--solver", default="dpll", help="The solver to use, e.g. dpll or cdcl",
+    )
     parser.add_argument(
         "--heuristic", default="random", help="The heuristic to use",
     )
+    parser.add_argument(
+        "--engine", default="simplify", help="The propagation engine to use",
+    )
+    parser.add_argument(
+        "--algorithm", default="probsat", help="Local search, probsat or walksat",
+    )
+    parser.add_argument(
+        "--backend", default="sets", help="The cnf representation, sets, numpy or bitset",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="Fill in singles on the grid and only encode the undecided cells",
+    )
+    parser.add_argument(
+        "--preprocess_cnf",
+        action="store_true",
+        help="Simplify the cnf by subsumption, probing and variable elimination",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Every worker loads the rules into one CDCL solver and solves each "
+        "puzzle under its givens as assumptions, keeping the learned clauses",
+    )
+    parser.add_argument(
+        "--max_models",
+        default=1,
+        type=int,
+        help="Count solutions up to this many with cdcl, 2 checks uniqueness, 0 all",
+    )
+    parser.add_argument(
+        "--shared_rules",
+        action="store_true",
+        help="Keep one copy of the rules in shared memory for all workers",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Append to the results of an earlier run, skipping what it solved",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Add timers, decisions, conflicts, depth and cnf size to the results",
+    )
+    parser.add_argument(
+        "--trace_memory",
+        action="store_true",
+        help="Also add the peak memory of every solve, which slows them down",
+    )
     parser.add_argument(
         "--grid", default=9, type=int, help="Gridsize of the sudoku, e.g. 9 for 9x9"
     )
@@ -117,4 +455,23 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     freeze_support()
-    main(args.collection, args.heuristic, args.grid, args.repeat, args.n_max, args.ids)
+    main(
+        args.collection,
+        args.heuristic,
+        args.grid,
+        args.repeat,
+        args.n_max,
+        args.ids,
+        args.engine,
+        args.solver,
+        args.backend,
+        args.preprocess,
+        args.shared_rules,
+        args.resume,
+        args.metrics,
+        args.trace_memory,
+        args.preprocess_cnf,
+        args.incremental,
+        args.max_models,
+        args.algorithm,
+    )
@@ -0,0 +1,349 @@
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .solvers import Solver
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Indices of the set bits, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitsetCNF:
+    """Cnf of which every clause is a pair of int bitmasks, one with the
+    variables occurring positively and one with those occurring negated.
+
+    Variables are renumbered densely to bit indices, the mapping is shared by
+    every cnf derived from the same original. Assignments are a pair of
+    masks as well, so satisfying and shortening clauses are bitwise
+    operations. Iterating yields the clauses as sets of literals.
+    """
+
+    def __init__(
+        self,
+        positive: List[int],
+        negative: List[int],
+        variables: List[int],
+        bits: Dict[int, int],
+    ) -> None:
+        self.positive = positive
+        self.negative = negative
+        # Variable of every bit index and the other way around
+        self.variables = variables
+        self.bits = bits
+
+    @classmethod
+    def from_cnf(cls, cnf: Iterable[Iterable[int]]) -> "BitsetCNF":
+        clauses = [list(clause) for clause in cnf]
+        variables = sorted({abs(literal) for clause in clauses for literal in clause})
+        bits = {variable: index for index, variable in enumerate(variables)}
+
+        positive = []
+        negative = []
+        for clause in clauses:
+            p = n = 0
+            for literal in clause:
+                if literal > 0:
+                    p |= 1 << bits[literal]
+                else:
+                    n |= 1 << bits[-literal]
+            positive.append(p)
+            negative.append(n)
+
+        return cls(positive, negative, variables, bits)
+
+    def derive(self, positive: List[int], negative: List[int]) -> "BitsetCNF":
+        return BitsetCNF(positive, negative, self.variables, self.bits)
+
+    def encode(self, literals: Iterable[int]) -> Tuple[int, int]:
+        """Masks of the variables assigned true and false by the literals"""
+        true = false = 0
+        bits = self.bits
+        for literal in literals:
+            if literal > 0:
+                true |= 1 << bits[literal]
+            else:
+                false |= 1 << bits[-literal]
+
+        return true, false
+
+    def decode(self, positive: int, negative: int) -> Set[int]:
+        """Literals of a pair of masks"""
+        variables = self.variables
+
+        return {variables[index] for index in iter_bits(positive)} | {
+            -variables[index] for index in iter_bits(negative)
+        }
+
+    def to_cnf(self) -> List[Set[int]]:
+        return list(self)
+
+    def __len__(self) -> int:
+        return len(self.positive)
+
+    def __iter__(self) -> Iterator[Set[int]]:
+        for p, n in zip(self.positive, self.negative):
+            yield self.decode(p, n)
+
+
+class BitsetBackend(Solver):
+    """The cnf operations of `Solver` on a BitsetCNF. Unit clauses are the
+    clauses with a single bit set and pure literals follow from the union of
+    all positive and all negative masks. The heuristics count the literals per
+    clause length with a `sliced_sum` of the masks, lookahead works on the
+    decoded clauses."""
+
+    @staticmethod
+    def convert(cnf: Iterable[Iterable[int]]) -> BitsetCNF:
+        if isinstance(cnf, BitsetCNF):
+            return cnf
+        return BitsetCNF.from_cnf(cnf)
+
+    @staticmethod
+    def occurring(cnf: BitsetCNF) -> Tuple[int, int]:
+        """Masks of the variables occurring positively and negated"""
+        positive = negative = 0
+        for p in cnf.positive:
+            positive |= p
+        for n in cnf.negative:
+            negative |= n
+
+        return positive, negative
+
+    @classmethod
+    def determine_literals(cls, cnf: BitsetCNF) -> Set[int]:
+        if not isinstance(cnf, BitsetCNF):
+            return Solver.determine_literals(cnf)
+
+        positive, negative = cls.occurring(cnf)
+        return {cnf.variables[index] for index in iter_bits(positive | negative)}
+
+    @classmethod
+    def determine_pure_literals(cls, cnf: BitsetCNF) -> Set[int]:
+        positive, negative = cls.occurring(cnf)
+        return cnf.decode(positive & ~negative, negative & ~positive)
+
+    @staticmethod
+    def determine_unit_clauses(cnf: BitsetCNF) -> Set[int]:
+        true, false = BitsetBackend.unit_masks(cnf)
+        return cnf.decode(true, false)
+
+    @staticmethod
+    def unit_masks(cnf: BitsetCNF) -> Tuple[int, int]:
+        """Masks of the literals in unit clauses, a single bit over both masks"""
+        true = false = 0
+        for p, n in zip(cnf.positive, cnf.negative):
+            if p:
+                if not n and not p & (p - 1):
+                    true |= p
+            elif n and not n & (n - 1):
+                false |= n
+
+        return true, false
+
+    @staticmethod
+    def assign(cnf: BitsetCNF, true: int, false: int) -> BitsetCNF:
+        """Remove the clauses satisfied by an assignment and the false
+        literals from the others"""
+        positive = []
+        negative = []
+        keep_positive = ~false
+        keep_negative = ~true
+
+        for p, n in zip(cnf.positive, cnf.negative):
+            if p & true or n & false:
+                continue
+            positive.append(p & keep_positive)
+            negative.append(n & keep_negative)
+
+        return cnf.derive(positive, negative)
+
+    @classmethod
+    def remove_literal(cls, cnf: BitsetCNF, literal: int) -> BitsetCNF:
+        return cls.assign(cnf, *cnf.encode([literal]))
+
+    @classmethod
+    def simplify(cls, cnf: BitsetCNF) -> Tuple[BitsetCNF, Set[int]]:
+        true, false = cls.unit_masks(cnf)
+        positive, negative = cls.occurring(cnf)
+        # Pure literals can't contradict a unit clause, as it contains the other
+        true |= positive & ~negative
+        false |= negative & ~positive
+
+        removed = cnf.decode(true, false)
+        if true & false:
+            # Opposite unit clauses, assigning both leaves the empty clause
+            return cnf.derive([0], [0]), removed
+
+        return cls.assign(cnf, true, false), removed
+
+    @staticmethod
+    def check_satisfaction(cnf: BitsetCNF) -> Optional[bool]:
+        if len(cnf) == 0:
+            return True
+
+        for p, n in zip(cnf.positive, cnf.negative):
+            if not p and not n:
+                return False
+
+        return None
+
+    @staticmethod
+    def sliced_sum(masks: Iterable[int]) -> List[int]:
+        """Add up masks per bit in binary, bit j of plane k is bit k of the
+        amount of masks with bit j set. Every mask costs a few bitwise
+        operations, whatever the amount of bits set in it."""
+        planes: List[int] = []
+        for carry in masks:
+            for k, plane in enumerate(planes):
+                planes[k] = plane ^ carry
+                carry &= plane
+                if not carry:
+                    break
+            else:
+                if carry:
+                    planes.append(carry)
+
+        return planes
+
+    @staticmethod
+    def bit_counts(planes: List[int]) -> Dict[int, int]:
+        """Count per bit index of a `sliced_sum`"""
+        occurring = 0
+        for plane in planes:
+            occurring |= plane
+
+        return {
+            index: sum((plane >> index & 1) << k for k, plane in enumerate(planes))
+            for index in iter_bits(occurring)
+        }
+
+    @classmethod
+    def literal_counts(cls, cnf: BitsetCNF) -> Dict[int, Dict[int, int]]:
+        """Per clause length the amount of clauses every literal occurs in"""
+        groups: Dict[int, Tuple[List[int], List[int]]] = {}
+        for p, n in zip(cnf.positive, cnf.negative):
+            length = bin(p | n).count("1")
+            if length not in groups:
+                groups[length] = ([], [])
+            groups[length][0].append(p)
+            groups[length][1].append(n)
+
+        variables = cnf.variables
+        counts = {}
+        for length, (positive, negative) in groups.items():
+            count = {
+                variables[index]: c
+                for index, c in cls.bit_counts(cls.sliced_sum(positive)).items()
+            }
+            for index, c in cls.bit_counts(cls.sliced_sum(negative)).items():
+                count[-variables[index]] = c
+            counts[length] = count
+
+        return counts
+
+    @classmethod
+    def total_counts(cls, cnf: BitsetCNF) -> Dict[int, int]:
+        """The amount of clauses every literal occurs in"""
+        total: Dict[int, int] = {}
+        for count in cls.literal_counts(cnf).values():
+            for literal, c in count.items():
+                total[literal] = total.get(literal, 0) + c
+
+        return total
+
+    @classmethod
+    def get_literal_random(cls, cnf: BitsetCNF) -> int:
+        return random.choice(list(cls.determine_literals(cnf)))
+
+    @classmethod
+    def get_literal_weighted(cls, cnf: BitsetCNF) -> int:
+        count = cls.total_counts(cnf)
+        return random.choices(list(count), list(count.values()))[0]
+
+    @classmethod
+    def get_literal_dlis(cls, cnf: BitsetCNF) -> int:
+        count = cls.total_counts(cnf)
+        max_count = max(count.values())
+        return random.choice([lit for lit, c in count.items() if c == max_count])
+
+    @classmethod
+    def get_literal_dlcs(cls, cnf: BitsetCNF) -> int:
+        count = cls.total_counts(cnf)
+        combined: Dict[int, int] = {}
+        for literal, c in count.items():
+            combined[abs(literal)] = combined.get(abs(literal), 0) + c
+
+        max_count = max(combined.values())
+        variable = random.choice([v for v, c in combined.items() if c == max_count])
+        if count.get(variable, 0) > count.get(-variable, 0):
+            return variable
+
+        return -variable
+
+    @classmethod
+    def weights(cls, cnf: BitsetCNF) -> Dict[int, float]:
+        """Jeroslow-Wang weight of every literal, the sum of 2^-length over the
+        clauses it occurs in"""
+        weights: Dict[int, float] = {}
+        for length, count in cls.literal_counts(cnf).items():
+            weight = 2.0 ** -length
+            for literal, c in count.items():
+                weights[literal] = weights.get(literal, 0.0) + c * weight
+
+        return weights
+
+    @classmethod
+    def get_literal_jw(cls, cnf: BitsetCNF) -> int:
+        weights = cls.weights(cnf)
+        return max(weights, key=weights.get)
+
+    @classmethod
+    def get_literal_jwtwo(cls, cnf: BitsetCNF) -> int:
+        weights = cls.weights(cnf)
+        combined: Dict[int, float] = {}
+        for literal, weight in weights.items():
+            combined[abs(literal)] = combined.get(abs(literal), 0.0) + weight
+
+        variable = max(combined, key=combined.get)
+        if weights.get(-variable, 0.0) > weights.get(variable, 0.0):
+            return -variable
+
+        return variable
+
+    @classmethod
+    def get_literal_moms(cls, cnf: BitsetCNF, k=2) -> int:
+        counts = cls.literal_counts(cnf)
+        smallest = counts[min(counts)]
+
+        max_val = float("-inf")
+        max_lit = 0
+        for variable in cls.determine_literals(cnf):
+            count_pos = smallest.get(variable, 0)
+            count_neg = smallest.get(-variable, 0)
+            val = (count_pos + count_neg) * 2 ** k + count_pos * count_neg
+
+            if val > max_val:
+                max_val = val
+                max_lit = variable if count_pos >= count_neg else -variable
+
+        return max_lit
+
+    @classmethod
+    def get_literal_mams(cls, cnf: BitsetCNF) -> int:
+        counts = cls.literal_counts(cnf)
+        smallest = counts[min(counts)]
+        total: Dict[int, int] = {}
+        for count in counts.values():
+            for literal, c in count.items():
+                total[literal] = total.get(literal, 0) + c
+
+        # Occurrences of the variable plus those of its negation in the
+        # smallest clauses
+        return max(
+            cls.determine_literals(cnf),
+            key=lambda v: total.get(v, 0) + smallest.get(-v, 0),
+        )
@@ -0,0 +1,161 @@
+import hashlib
+import mmap
+from array import array
+from os import getpid, path, remove, replace
+from typing import Optional, Sequence, Union, overload
+
+from .utils import CNFtype, iter_sudoku_collection
+
+# Identifies the layout of the file, bumped when it changes
+MAGIC = 0x53554443
+VERSION = 1
+
+# Magic, version, size, amount of sudokus and amount of literals
+HEADER_SIZE = 5 * 8
+DIGEST_SIZE = 32
+
+
+class EncodedCollection(Sequence[CNFtype]):
+    """Collection of sudokus that is parsed once and then kept as a binary
+    file next to the text, which is memory-mapped on every later use.
+
+    The file holds an int64 header, the SHA-256 of the text it was made from,
+    the int64 offsets of every sudoku into the literals and the int32 literals
+    of all givens. As long as the hash matches the text is never parsed
+    again, and any sudoku can be read directly by its index. Without
+    `persist`, or if the file can't be written, the encoding stays in memory.
+    """
+
+    def __init__(self, filepath: str, size: int = 9, persist: bool = True) -> None:
+        self.filepath = filepath
+        self.size = size
+        self.cache_filepath = f"{filepath}.{size}x{size}.bin"
+
+        self.digest = self.hash(filepath)
+        self.file = None
+        self.buffer: Optional[Union[bytes, mmap.mmap]] = None
+
+        if persist:
+            self.buffer = self.open()
+        if self.buffer is None:
+            data = self.encode()
+            if persist:
+                self.write(data)
+                self.buffer = self.open()
+            if self.buffer is None:
+                self.buffer = data
+
+        view = memoryview(self.buffer)
+        header = view[:HEADER_SIZE].cast("q")
+        self.n_sudokus = header[3]
+
+        start = HEADER_SIZE + DIGEST_SIZE
+        end = start + 8 * (self.n_sudokus + 1)
+        self.offsets = view[start:end].cast("q")
+        self.literals = view[end:].cast("i")
+        header.release()
+        view.release()
+
+    @staticmethod
+    def hash(filepath: str) -> bytes:
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+        return digest.digest()
+
+    def encode(self) -> bytes:
+        """Parse the text collection into the binary layout"""
+        offsets = array("q", [0])
+        literals = array("i")
+
+        for givens in iter_sudoku_collection(self.filepath, self.size):
+            literals.extend(literal for clause in givens for literal in clause)
+            offsets.append(len(literals))
+
+        header = array(
+            "q", [MAGIC, VERSION, self.size, len(offsets) - 1, len(literals)]
+        )
+
+        return header.tobytes() + self.digest + offsets.tobytes() + literals.tobytes()
+
+    def write(self, data: bytes) -> None:
+        """Write through a temporary file, so concurrent runs never read half
+        a cache"""
+        temporary = f"{self.cache_filepath}.{getpid()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(data)
+            replace(temporary, self.cache_filepath)
+        except OSError:
+            # E.g. a read-only directory, the encoding still works from memory
+            if path.exists(temporary):
+                remove(temporary)
+
+    def open(self) -> Optional[mmap.mmap]:
+        """Map the cache into memory, None if it is missing or outdated"""
+        try:
+            self.file = open(self.cache_filepath, "rb")
+            buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Missing, or empty which can't be mapped
+            self.close()
+            return None
+
+        valid = len(buffer) >= HEADER_SIZE + DIGEST_SIZE
+        if valid:
+            header = array("q")
+            header.frombytes(buffer[:HEADER_SIZE])
+            n_sudokus, n_literals = header[3:]
+            valid = (
+                list(header[:3]) == [MAGIC, VERSION, self.size]
+                and buffer[HEADER_SIZE : HEADER_SIZE + DIGEST_SIZE] == self.digest
+                and len(buffer)
+                == HEADER_SIZE + DIGEST_SIZE + 8 * (n_sudokus + 1) + 4 * n_literals
+            )
+
+        if not valid:
+            buffer.close()
+            self.close()
+            return None
+
+        return buffer
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.offsets.release()
+            self.literals.release()
+            self.buffer.close()
+        self.buffer = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self) -> "EncodedCollection":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_sudokus
+
+    @overload
+    def __getitem__(self, index: int) -> CNFtype:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[CNFtype]:
+        ...
+
+    def __getitem__(self, index):
+        """The givens of a sudoku as unit clauses, like `iter_sudoku_collection`"""
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+
+        index = range(len(self))[index]
+        start, end = self.offsets[index], self.offsets[index + 1]
+
+        return [{literal} for literal in self.literals[start:end].tolist()]
@@ -0,0 +1,448 @@
+import random
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import numpy as np
+
+from .lookahead import lookahead
+from .utils import CNFtype, DimacsReader
+
+if TYPE_CHECKING:
+    from .variables import VariableMap
+
+
+class CompactCNF:
+    """Array-backed cnf.
+
+    All literals are stored in one flat int32 array, clause `i` spanning
+    `literals[offsets[i]:offsets[i + 1]]`. Satisfied clauses are switched off
+    in the `active` mask and false literals in the `present` mask, so removing
+    a literal never touches the literal array itself and copies are cheap to
+    make. Iterating gives the remaining clauses as sets, like a CNFtype.
+    """
+
+    def __init__(
+        self,
+        literals: np.ndarray,
+        offsets: np.ndarray,
+        active: Optional[np.ndarray] = None,
+        present: Optional[np.ndarray] = None,
+        clause_ids: Optional[np.ndarray] = None,
+        conflict: bool = False,
+        n_variables: Optional[int] = None,
+    ) -> None:
+        self.literals = literals
+        self.offsets = offsets
+
+        n_clauses = len(offsets) - 1
+        self.active = np.ones(n_clauses, dtype=bool) if active is None else active
+        if present is None:
+            present = np.ones(len(literals), dtype=bool)
+        self.present = present
+
+        # Clause index per literal, shared by every copy
+        if clause_ids is None:
+            clause_ids = np.repeat(
+                np.arange(n_clauses, dtype=np.int32), np.diff(offsets)
+            )
+        self.clause_ids = clause_ids
+
+        if n_variables is None:
+            n_variables = int(np.abs(literals).max()) if len(literals) else 0
+        self.n_variables = n_variables
+
+        # Set when both a literal and its negation were removed at once
+        self.conflict = conflict
+
+    @classmethod
+    def from_cnf(cls, cnf: Iterable[Iterable[int]]) -> "CompactCNF":
+        """Convert from a CNFtype"""
+        clauses = [list(clause) for clause in cnf]
+        lengths = np.fromiter((len(clause) for clause in clauses), dtype=np.int64)
+
+        offsets = np.zeros(len(clauses) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        literals = np.fromiter(
+            (literal for clause in clauses for literal in clause),
+            dtype=np.int32,
+            count=int(offsets[-1]),
+        )
+
+        return cls(literals, offsets)
+
+    @classmethod
+    def from_dimacs(cls, filepath: str, strict: bool = False) -> "CompactCNF":
+        """Read a DIMACS file straight into arrays, without per-clause sets"""
+        reader = DimacsReader(filepath, strict=strict)
+        tokens = np.concatenate(
+            [np.array(chunk, dtype=np.int32) for chunk in reader.chunks()]
+            + [np.zeros(0, dtype=np.int32)]
+        )
+
+        # A last clause is allowed to miss its terminating 0
+        if len(tokens) and tokens[-1] != 0:
+            tokens = np.append(tokens, np.int32(0))
+
+        # Clause ends, corrected for the zeros that are left out
+        zeros = np.flatnonzero(tokens == 0)
+        offsets = np.zeros(len(zeros) + 1, dtype=np.int64)
+        offsets[1:] = zeros - np.arange(len(zeros))
+        literals = tokens[tokens != 0]
+
+        max_variable = int(np.abs(literals).max()) if len(literals) else 0
+        reader.validate(len(zeros), max_variable)
+
+        return cls(literals, offsets, n_variables=max_variable)
+
+    def to_cnf(self) -> CNFtype:
+        """Convert to a CNFtype"""
+        return list(self)
+
+    def copy(self, active: np.ndarray, present: np.ndarray, conflict=False):
+        """Same clauses with different masks"""
+        return CompactCNF(
+            self.literals,
+            self.offsets,
+            active=active,
+            present=present,
+            clause_ids=self.clause_ids,
+            conflict=conflict,
+            n_variables=self.n_variables,
+        )
+
+    def renumber(self, variable_map: "VariableMap") -> "CompactCNF":
+        """Same clauses and masks over the variables of a `VariableMap`, only
+        the literals are copied so shared arrays stay shared"""
+        lookup = np.zeros(max(variable_map.dense, default=0) + 1, dtype=np.int32)
+        lookup[list(variable_map.dense)] = list(variable_map.dense.values())
+        literals = np.sign(self.literals) * lookup[np.abs(self.literals)]
+
+        return CompactCNF(
+            literals.astype(np.int32),
+            self.offsets,
+            active=self.active,
+            present=self.present,
+            clause_ids=self.clause_ids,
+            conflict=self.conflict,
+            n_variables=len(variable_map),
+        )
+
+    def __len__(self) -> int:
+        return int(self.active.sum())
+
+    def __iter__(self) -> Iterator[Set[int]]:
+        live = self.live_mask()
+        for index in np.flatnonzero(self.active):
+            start, end = self.offsets[index], self.offsets[index + 1]
+            yield set(self.literals[start:end][live[start:end]].tolist())
+
+    def live_mask(self) -> np.ndarray:
+        """Mask of the literals that are left in the active clauses"""
+        return self.present & self.active[self.clause_ids]
+
+    def live_literals(self) -> np.ndarray:
+        return self.literals[self.live_mask()]
+
+    def lengths(self) -> np.ndarray:
+        """Amount of remaining literals per clause, also for inactive clauses"""
+        return np.bincount(
+            self.clause_ids[self.present], minlength=len(self.active)
+        ).astype(np.int64)
+
+    def remove_literals(self, literals: Iterable[int]) -> "CompactCNF":
+        """Remove clauses containing any of the literals and shorten the clauses
+        containing their negations"""
+        remove = np.fromiter(literals, dtype=np.int32)
+        conflict = self.conflict or bool(np.isin(-remove, remove).any())
+
+        live = self.live_mask()
+        satisfied = np.isin(self.literals, remove) & live
+
+        active = self.active.copy()
+        active[self.clause_ids[satisfied]] = False
+        present = self.present & ~np.isin(self.literals, -remove)
+
+        return self.copy(active, present, conflict)
+
+
+class SharedCNF:
+    """CompactCNF whose arrays live in a shared memory segment.
+
+    Only the name and sizes of the segment are pickled, so a SharedCNF is
+    cheap to send to other processes. Calling `attach` there maps the arrays
+    of the segment read-only instead of copying them. The process that made
+    it with `create` has to `unlink` the segment when done, which is done on
+    leaving a with-statement.
+    """
+
+    def __init__(self, name: str, n_literals: int, n_clauses: int, n_variables: int):
+        self.name = name
+        self.n_literals = n_literals
+        self.n_clauses = n_clauses
+        self.n_variables = n_variables
+        self.memory: Optional[shared_memory.SharedMemory] = None
+
+    @classmethod
+    def create(cls, cnf: Iterable[Iterable[int]]) -> "SharedCNF":
+        """Copy a cnf into a new shared memory segment"""
+        compact = CompactBackend.convert(cnf)
+        n_literals, n_clauses = len(compact.literals), len(compact.offsets) - 1
+
+        shared = cls("", n_literals, n_clauses, compact.n_variables)
+        memory = shared_memory.SharedMemory(create=True, size=max(shared.nbytes, 1))
+        shared.name, shared.memory = memory.name, memory
+
+        offsets, literals, clause_ids = shared.views()
+        offsets[:] = compact.offsets
+        literals[:] = compact.literals
+        clause_ids[:] = compact.clause_ids
+
+        return shared
+
+    @property
+    def nbytes(self) -> int:
+        return 8 * (self.n_clauses + 1) + 4 * 2 * self.n_literals
+
+    def views(self):
+        """Offsets, literals and clause ids on top of the segment. The int64
+        offsets go first to keep every array aligned."""
+        buffer = self.memory.buf
+        n, m = self.n_literals, self.n_clauses + 1
+
+        offsets = np.ndarray(m, dtype=np.int64, buffer=buffer)
+        literals = np.ndarray(n, dtype=np.int32, buffer=buffer, offset=8 * m)
+        clause_ids = np.ndarray(n, dtype=np.int32, buffer=buffer, offset=8 * m + 4 * n)
+
+        return offsets, literals, clause_ids
+
+    def attach(self) -> CompactCNF:
+        """The shared cnf, attached once per process"""
+        if self.name not in _attached:
+            if self.memory is None:
+                self.memory = shared_memory.SharedMemory(name=self.name)
+
+            offsets, literals, clause_ids = self.views()
+            for array in (offsets, literals, clause_ids):
+                array.flags.writeable = False
+
+            # The segment has to stay open as long as the arrays are in use
+            _attached[self.name] = self.memory, CompactCNF(
+                literals,
+                offsets,
+                clause_ids=clause_ids,
+                n_variables=self.n_variables,
+            )
+
+        return _attached[self.name][1]
+
+    def unlink(self) -> None:
+        """Free the segment, only by the process that created it"""
+        _attached.pop(self.name, None)
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def __enter__(self) -> "SharedCNF":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.unlink()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["memory"] = None
+        return state
+
+
+# Shared cnfs this process is attached to, by segment name
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, CompactCNF]] = {}
+
+
+class CompactBackend:
+    """Vectorized counterparts of the cnf operations on `Solver`, to run DPLL on
+    a CompactCNF. Counting is batched with np.bincount over literal indices."""
+
+    @staticmethod
+    def convert(cnf: Iterable[Iterable[int]]) -> CompactCNF:
+        if isinstance(cnf, CompactCNF):
+            return cnf
+        return CompactCNF.from_cnf(cnf)
+
+    @staticmethod
+    def determine_literals(cnf: CompactCNF) -> Set[int]:
+        """Determine all unique variables"""
+        return set(np.unique(np.abs(cnf.live_literals())).tolist())
+
+    @staticmethod
+    def determine_pure_literals(cnf: CompactCNF) -> Set[int]:
+        """Determine all pure literals"""
+        unique_literals = np.unique(cnf.live_literals())
+        pure = unique_literals[~np.isin(-unique_literals, unique_literals)]
+
+        return set(pure.tolist())
+
+    @staticmethod
+    def determine_unit_clauses(cnf: CompactCNF) -> Set[int]:
+        """Return the unit clauses in a cnf"""
+        units = cnf.active & (cnf.lengths() == 1)
+        unit_literals = cnf.literals[cnf.present & units[cnf.clause_ids]]
+
+        return set(unit_literals.tolist())
+
+    @staticmethod
+    def remove_literal(cnf: CompactCNF, literal: int) -> CompactCNF:
+        return cnf.remove_literals([literal])
+
+    @classmethod
+    def simplify(cls, cnf: CompactCNF):
+        """Remove unit clauses and pure literals, return new cnf and removed literals"""
+        remove_literals = cls.determine_unit_clauses(cnf) | cls.determine_pure_literals(
+            cnf
+        )
+
+        if remove_literals:
+            cnf = cnf.remove_literals(remove_literals)
+
+        return cnf, remove_literals
+
+    @staticmethod
+    def check_satisfaction(cnf: CompactCNF) -> Optional[bool]:
+        if cnf.conflict:
+            return False
+
+        # Satisfied is CNF contains no clauses
+        if not cnf.active.any():
+            return True
+
+        # Unsatisfied if CNF contains empty clauses
+        if (cnf.lengths()[cnf.active] == 0).any():
+            return False
+
+        return None
+
+    @staticmethod
+    def literal_counts(cnf: CompactCNF, literals: np.ndarray, weights=None):
+        """Count (or sum weights of) literals, indexed by literal + n_variables"""
+        n = cnf.n_variables
+        return np.bincount(literals + n, weights=weights, minlength=2 * n + 1)
+
+    @staticmethod
+    def variable_counts(cnf: CompactCNF, literals: np.ndarray, weights=None):
+        """Count (or sum weights of) literals, indexed by variable"""
+        return np.bincount(
+            np.abs(literals), weights=weights, minlength=cnf.n_variables + 1
+        )
+
+    @staticmethod
+    def choice(scores: np.ndarray) -> int:
+        """Randomly pick one of the indices with the highest score"""
+        return int(random.choice(np.flatnonzero(scores == scores.max())))
+
+    @classmethod
+    def get_literal_random(cls, cnf: CompactCNF) -> int:
+        """Randomly select a single literal"""
+        return int(random.choice(np.unique(np.abs(cnf.live_literals()))))
+
+    @classmethod
+    def get_literal_weighted(cls, cnf: CompactCNF) -> int:
+        """Randomly select a single literal. This is weighted, i.e.
+        variable that occurs more often has a higher chance."""
+        return int(random.choice(cnf.live_literals()))
+
+    @classmethod
+    def get_literal_dlis(cls, cnf: CompactCNF) -> int:
+        """Greatest individual sum."""
+        counts = cls.literal_counts(cnf, cnf.live_literals())
+
+        return cls.choice(counts) - cnf.n_variables
+
+    @classmethod
+    def get_literal_dlcs(cls, cnf: CompactCNF) -> int:
+        """Greatest combined sum."""
+        live = cnf.live_literals()
+        variable = cls.choice(cls.variable_counts(cnf, live))
+
+        counts = cls.literal_counts(cnf, live)
+        n = cnf.n_variables
+        if counts[n + variable] > counts[n - variable]:
+            return variable
+
+        return -variable
+
+    @classmethod
+    def clause_weights(cls, cnf: CompactCNF) -> np.ndarray:
+        """2^-length of the clause, for every live literal"""
+        live = cnf.live_mask()
+        return 2.0 ** -cnf.lengths()[cnf.clause_ids[live]]
+
+    @classmethod
+    def get_literal_jw(cls, cnf: CompactCNF) -> int:
+        """Jeroslaw-Wang one-sided."""
+        weights = cls.literal_counts(cnf, cnf.live_literals(), cls.clause_weights(cnf))
+
+        return int(np.argmax(weights)) - cnf.n_variables
+
+    @classmethod
+    def get_literal_jwtwo(cls, cnf: CompactCNF) -> int:
+        """Jeroslaw-Wang two-sided."""
+        live = cnf.live_literals()
+        weights = cls.clause_weights(cnf)
+
+        variable = int(np.argmax(cls.variable_counts(cnf, live, weights)))
+
+        one_sided = cls.literal_counts(cnf, live, weights)
+        n = cnf.n_variables
+        if one_sided[n - variable] > one_sided[n + variable]:
+            return -variable
+
+        return variable
+
+    @classmethod
+    def min_clause_literals(cls, cnf: CompactCNF) -> np.ndarray:
+        """Live literals in the clauses of minimum size"""
+        lengths = cnf.lengths()
+        min_clause = lengths[cnf.active].min()
+        in_min = cnf.active & (lengths == min_clause)
+
+        return cnf.literals[cnf.present & in_min[cnf.clause_ids]]
+
+    @classmethod
+    def get_literal_moms(cls, cnf: CompactCNF, k=2) -> int:
+        """Maximum occurence in clauses of minimum size"""
+        literals = cls.min_clause_literals(cnf)
+        count_pos = cls.variable_counts(cnf, literals[literals > 0])
+        count_neg = cls.variable_counts(cnf, literals[literals < 0])
+
+        values = ((count_pos + count_neg) * (2 ** k)) + (count_pos * count_neg)
+        # Only variables still in the cnf can be picked
+        occurring = cls.variable_counts(cnf, cnf.live_literals()) > 0
+        values = np.where(occurring, values, -1)
+
+        variable = int(np.argmax(values))
+        if count_pos[variable] >= count_neg[variable]:
+            return variable
+
+        return -variable
+
+    @classmethod
+    def get_literal_mams(cls, cnf: CompactCNF) -> int:
+        """Dynamic largest individual sum plus
+        Maximum occurence in clauses of minimum size."""
+        live = cnf.live_literals()
+        literals = cls.min_clause_literals(cnf)
+
+        values = cls.variable_counts(cnf, live[live > 0]) + cls.variable_counts(
+            cnf, literals[literals < 0]
+        )
+        occurring = cls.variable_counts(cnf, live) > 0
+        values = np.where(occurring, values, -1)
+
+        return int(np.argmax(values))
+
+    @classmethod
+    def get_literal_lookahead(cls, cnf: CompactCNF) -> int:
+        """Lookahead, on the remaining clauses as sets as trial propagation
+        follows single literals instead of whole arrays"""
+        return lookahead(cnf)
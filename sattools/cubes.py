@@ -0,0 +1,143 @@
+import multiprocessing as mp
+from typing import Any, Dict, List, Optional
+
+from .instrumentation import Metrics
+from .propagation import WatchedLiterals
+from .solvers import Solver, get_solver
+from .utils import CNFtype
+
+Cube = List[int]
+
+
+class CubeAndConquer(Solver):
+    def __init__(
+        self,
+        cnf: CNFtype,
+        verbose: bool = False,
+        identifier: Any = None,
+        depth: Optional[int] = None,
+        processes: Optional[int] = None,
+        split_heuristic: str = "jw",
+        conquer: str = "dpll",
+        conquer_kwargs: Optional[Dict[str, Any]] = None,
+        metrics: Optional[Metrics] = None,
+        preprocess: bool = False,
+    ) -> None:
+        """Splits the search tree of a single cnf over several processes.
+
+        The first `depth` levels are searched with unit propagation only,
+        branching on the `split_heuristic`. Every branch that is not refuted
+        at that depth becomes a cube: a partial assignment that is solved by
+        the `conquer` solver in a process pool. Cubes are handed out one at a
+        time, so an idle process takes the next cube while others still work
+        on hard ones. Search stops at the first satisfied cube, the cnf is
+        unsatisfiable when every cube is refuted."""
+        super().__init__(
+            cnf,
+            verbose=verbose,
+            identifier=identifier,
+            metrics=metrics,
+            preprocess=preprocess,
+        )
+
+        self.processes = processes or mp.cpu_count()
+        # Enough cubes to keep every process busy while others are stuck
+        self.depth = depth if depth is not None else (4 * self.processes).bit_length()
+        self.split = getattr(Solver, f"get_literal_{split_heuristic}")
+        # A cube is only refuted when the conquering solver can prove that
+        assert get_solver(conquer).complete, "cubes need a complete solver"
+        self.conquer = conquer
+        self.conquer_kwargs = conquer_kwargs or {}
+
+        self.backtrack_count = 0
+        self.propagation_count = 0
+        self.cube_count = 0
+        self.refuted_count = 0
+
+    def start(self) -> bool:
+        cubes = self.make_cubes()
+        if cubes is None:
+            # Satisfied while splitting already
+            return True
+
+        self.cube_count = len(cubes)
+        if self.verbose:
+            print(f"Conquering {len(cubes)} cubes with {self.processes} processes")
+
+        with mp.Pool(
+            self.processes,
+            initializer=init_worker,
+            initargs=(self.cnf, self.conquer, self.conquer_kwargs),
+        ) as pool:
+            for result in pool.imap_unordered(solve_cube, cubes):
+                self.backtrack_count += result["backtrack_count"]
+                self.propagation_count += result["propagation_count"]
+
+                if result["satisfied"]:
+                    self.set_solution(result["solution"])
+                    # Leaving the with-statement terminates the other cubes
+                    return True
+
+                self.refuted_count += 1
+
+        return False
+
+    def make_cubes(self) -> Optional[List[Cube]]:
+        """Split the search tree up to the depth, returns None if the cnf got
+        satisfied on the way"""
+        engine = WatchedLiterals(self.cnf, counted=True)
+        cubes: List[Cube] = []
+
+        if not engine.propagate():
+            return cubes
+
+        # Branches still to split, the cube is also the decision level
+        stack: List[Cube] = [[]]
+        while stack:
+            cube = stack.pop()
+            engine.backjump(max(len(cube) - 1, 0))
+
+            if cube:
+                engine.new_level()
+                engine.assign(cube[-1])
+                self.propagation_count += 1
+                if not engine.propagate():
+                    self.backtrack_count += 1
+                    continue
+
+            if engine.is_satisfied():
+                self.set_solution(engine.trail)
+                return None
+
+            if len(cube) == self.depth:
+                cubes.append(cube)
+                continue
+
+            literal = self.split(engine.residual_cnf())
+            stack.append([*cube, -literal])
+            stack.append([*cube, literal])
+
+        return cubes
+
+
+# Set per worker process by `init_worker`
+_worker: Dict[str, Any] = {}
+
+
+def init_worker(cnf: CNFtype, conquer: str, conquer_kwargs: Dict[str, Any]) -> None:
+    """Receive the cnf once per process instead of with every cube"""
+    _worker.update(cnf=cnf, solver=get_solver(conquer), kwargs=conquer_kwargs)
+
+
+def solve_cube(cube: Cube) -> Dict[str, Any]:
+    """Solve the cnf with the literals of the cube as unit clauses"""
+    cnf = [*_worker["cnf"], *({literal} for literal in cube)]
+    solver = _worker["solver"](cnf, **_worker["kwargs"])
+    solver.solve()
+
+    return dict(
+        satisfied=solver.satisfied,
+        solution=solver.solution,
+        backtrack_count=solver.backtrack_count,
+        propagation_count=solver.propagation_count,
+    )
@@ -0,0 +1,239 @@
+from collections import defaultdict
+from typing import DefaultDict, List, Optional, Set, Tuple
+
+from .heuristics import IncrementalHeuristic
+from .utils import CNFtype
+
+
+class ClauseDatabase:
+    """Mutable clause database with an assignment trail.
+
+    Instead of building a new cnf for every assignment, every clause keeps
+    count of its true and unassigned literals. Assigning a literal updates
+    the counters of the clauses it occurs in, undoing it restores them again.
+    Assignments are stored on a trail that is split in decision levels, so
+    backtracking is done by popping the trail back to the start of a level.
+    """
+
+    def __init__(self, cnf: CNFtype) -> None:
+        self.clauses: List[List[int]] = []
+        # Maps a literal to the clauses (by index) it occurs in
+        self.occurrences: DefaultDict[int, List[int]] = defaultdict(list)
+        # Per clause the amount of true and unassigned literals
+        self.true_count: List[int] = []
+        self.free_count: List[int] = []
+        # Per literal the amount of unsatisfied clauses it is unassigned in
+        self.literal_count: DefaultDict[int, int] = defaultdict(int)
+        self.unsatisfied: Set[int] = set()
+
+        self.true: Set[int] = set()
+        self.trail: List[int] = []
+        # Trail sizes at the start of every decision level
+        self.trail_lim: List[int] = []
+
+        # Pending implied literals together with the clause implying them
+        self.queue: List[Tuple[int, int]] = []
+        self.conflicts = 0
+        self.inconsistent = False
+        # Literals whose count dropped to zero, their negation might be pure
+        self.pure_candidates: Set[int] = set()
+        # Kept up to date on every change of the clauses
+        self.heuristic: Optional[IncrementalHeuristic] = None
+
+        for clause in cnf:
+            self.add_clause(clause)
+
+        # Initially every literal is a candidate
+        self.pure_candidates.update(-literal for literal in self.literal_count)
+
+    @property
+    def level(self) -> int:
+        """Current decision level"""
+        return len(self.trail_lim)
+
+    def add_clause(self, clause: Set[int]) -> None:
+        """Add a clause to the database, only before assignments are made"""
+        literals = list(set(clause))
+
+        # Tautologies are always satisfied and can be ignored
+        if any(-literal in clause for literal in literals):
+            return
+
+        index = len(self.clauses)
+        self.clauses.append(literals)
+        self.true_count.append(0)
+        self.free_count.append(len(literals))
+        self.unsatisfied.add(index)
+
+        for literal in literals:
+            self.occurrences[literal].append(index)
+            self.literal_count[literal] += 1
+
+        if len(literals) == 0:
+            self.inconsistent = True
+        elif len(literals) == 1:
+            self.queue.append((literals[0], index))
+
+    def attach(self, heuristic: IncrementalHeuristic) -> None:
+        """Attach a heuristic that gets notified of every change to the clauses"""
+        self.heuristic = heuristic
+        heuristic.attach(self)
+
+    def value(self, literal: int):
+        """Return the truth value of a literal, None when unassigned"""
+        if literal in self.true:
+            return True
+        if -literal in self.true:
+            return False
+
+        return None
+
+    def assign(self, literal: int) -> None:
+        """Make a literal true and update the clauses it occurs in"""
+        true = self.true
+        true.add(literal)
+        self.trail.append(literal)
+
+        clauses = self.clauses
+        literal_count = self.literal_count
+        heuristic = self.heuristic
+
+        # Clauses containing the literal become satisfied
+        for index in self.occurrences[literal]:
+            self.true_count[index] += 1
+            if self.true_count[index] == 1:
+                self.unsatisfied.discard(index)
+                free = [
+                    other
+                    for other in clauses[index]
+                    if other == literal or (other not in true and -other not in true)
+                ]
+                for other in free:
+                    literal_count[other] -= 1
+                    if literal_count[other] == 0:
+                        self.pure_candidates.add(other)
+
+                if heuristic is not None:
+                    heuristic.satisfied(free, self.free_count[index])
+
+        # Clauses containing the negation get shorter
+        negation = -literal
+        for index in self.occurrences[negation]:
+            self.free_count[index] -= 1
+            if self.true_count[index] > 0:
+                continue
+
+            literal_count[negation] -= 1
+            if heuristic is not None:
+                heuristic.shortened(index, negation, self.free_count[index] + 1)
+
+            if self.free_count[index] == 0:
+                self.conflicts += 1
+                if heuristic is not None:
+                    heuristic.conflict(index)
+            elif self.free_count[index] == 1:
+                for other in clauses[index]:
+                    if other not in true and -other not in true:
+                        self.queue.append((other, index))
+                        break
+
+    def unassign(self) -> None:
+        """Undo the last assignment on the trail"""
+        literal = self.trail.pop()
+        true = self.true
+
+        clauses = self.clauses
+        literal_count = self.literal_count
+        heuristic = self.heuristic
+
+        # Reverse of `assign`, in the opposite order
+        negation = -literal
+        for index in self.occurrences[negation]:
+            self.free_count[index] += 1
+            if self.true_count[index] > 0:
+                continue
+
+            literal_count[negation] += 1
+            if heuristic is not None:
+                heuristic.lengthened(index, negation, self.free_count[index])
+
+            if self.free_count[index] == 1:
+                self.conflicts -= 1
+
+        for index in self.occurrences[literal]:
+            self.true_count[index] -= 1
+            if self.true_count[index] == 0:
+                self.unsatisfied.add(index)
+                free = [
+                    other
+                    for other in clauses[index]
+                    if other == literal or (other not in true and -other not in true)
+                ]
+                for other in free:
+                    literal_count[other] += 1
+
+                if heuristic is not None:
+                    heuristic.unsatisfied(free, self.free_count[index])
+
+        true.discard(literal)
+
+    def new_level(self) -> None:
+        """Open a new decision level"""
+        self.trail_lim.append(len(self.trail))
+
+    def backjump(self, level: int) -> None:
+        """Undo every assignment made above the given decision level"""
+        if level >= self.level:
+            return
+
+        trail_size = self.trail_lim[level]
+        del self.trail_lim[level:]
+
+        while len(self.trail) > trail_size:
+            self.unassign()
+
+        self.queue.clear()
+        self.pure_candidates.clear()
+
+    def propagate(self) -> bool:
+        """Assign implied literals until none are left, False on a conflict"""
+        if self.inconsistent:
+            return False
+
+        queue = self.queue
+        while self.conflicts == 0 and queue:
+            literal, index = queue.pop()
+            # Skip implications of clauses that got satisfied in the meantime
+            if self.true_count[index] > 0:
+                continue
+            self.assign(literal)
+
+        queue.clear()
+
+        return self.conflicts == 0
+
+    def pure_literals(self) -> Set[int]:
+        """Return unassigned literals whose negation is in no unsatisfied clause"""
+        literal_count = self.literal_count
+
+        pure_literals = {
+            -literal
+            for literal in self.pure_candidates
+            if literal_count[literal] == 0 and literal_count[-literal] > 0
+        }
+        self.pure_candidates.clear()
+
+        return pure_literals
+
+    def is_satisfied(self) -> bool:
+        """All clauses are satisfied"""
+        return len(self.unsatisfied) == 0
+
+    def residual_cnf(self) -> CNFtype:
+        """Return the unsatisfied clauses without their false literals"""
+        true = self.true
+
+        return [
+            {literal for literal in self.clauses[index] if -literal not in true}
+            for index in self.unsatisfied
+        ]
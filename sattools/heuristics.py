@@ -0,0 +1,578 @@
+import heapq
+import random
+from collections import defaultdict
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    DefaultDict,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from .lookahead import CANDIDATES
+
+if TYPE_CHECKING:
+    from .database import ClauseDatabase
+
+Key = TypeVar("Key", bound=Hashable)
+
+
+class ScoreHeap(Generic[Key]):
+    """Max-heap of scores that can be updated in O(log n).
+
+    Updating a score pushes a new entry instead of moving the old one, so
+    outdated entries are skipped (and dropped) when looking for the best.
+    """
+
+    def __init__(self) -> None:
+        self.scores: Dict[Key, float] = {}
+        self.heap: List[Tuple[float, Key]] = []
+
+    def update(self, key: Key, score: float) -> None:
+        if self.scores.get(key) == score:
+            return
+
+        self.scores[key] = score
+        heapq.heappush(self.heap, (-score, key))
+
+        # Rebuild when outdated entries start to dominate
+        if len(self.heap) > 4 * len(self.scores) + 1024:
+            self.heap = [(-s, k) for k, s in self.scores.items()]
+            heapq.heapify(self.heap)
+
+    def push(self, key: Key) -> None:
+        """Push the current score again, for keys dropped while not eligible"""
+        heapq.heappush(self.heap, (-self.scores.get(key, 0.0), key))
+        self.scores.setdefault(key, 0.0)
+
+    def best(self, eligible: Callable[[Key], bool]) -> Optional[Key]:
+        """Return the eligible key with the highest score"""
+        heap = self.heap
+
+        while heap:
+            score, key = heap[0]
+            if self.scores[key] == -score and eligible(key):
+                return key
+            heapq.heappop(heap)
+
+        return None
+
+
+class IncrementalHeuristic:
+    """Branching heuristic whose scores are kept up to date by a clause database.
+
+    Scores only count unassigned literals in unsatisfied clauses. The database
+    reports when clauses get satisfied or shortened, and reports the reverse
+    when assignments are undone, which restores the scores on backtracking.
+    """
+
+    # Whether scores depend on the length of the clauses
+    size_sensitive = False
+
+    def __init__(self) -> None:
+        self.counts: DefaultDict[int, int] = defaultdict(int)
+
+    def attach(self, database: "ClauseDatabase") -> None:
+        """Initialise the scores from the current state of the database"""
+        self.database = database
+
+        for index in database.unsatisfied:
+            literals = [
+                literal
+                for literal in database.clauses[index]
+                if database.value(literal) is None
+            ]
+            self.unsatisfied(literals, database.free_count[index])
+
+    def satisfied(self, literals: List[int], size: int) -> None:
+        """A clause with the given unassigned literals got satisfied"""
+        for literal in literals:
+            self.decrease(literal, size)
+
+    def unsatisfied(self, literals: List[int], size: int) -> None:
+        """Reverse of `satisfied`"""
+        for literal in literals:
+            self.increase(literal, size)
+
+    def shortened(self, index: int, literal: int, size: int) -> None:
+        """A literal in an unsatisfied clause of the given size became false"""
+        self.decrease(literal, size)
+
+        if self.size_sensitive:
+            value = self.database.value
+            for other in self.database.clauses[index]:
+                if value(other) is None:
+                    self.resize(other, size, size - 1)
+
+    def lengthened(self, index: int, literal: int, size: int) -> None:
+        """Reverse of `shortened`"""
+        if self.size_sensitive:
+            value = self.database.value
+            for other in self.database.clauses[index]:
+                if other != literal and value(other) is None:
+                    self.resize(other, size - 1, size)
+
+        self.increase(literal, size)
+
+    def conflict(self, index: int) -> None:
+        """The clause with the given index became empty"""
+        ...
+
+    def increase(self, literal: int, size: int) -> None:
+        self.counts[literal] += 1
+        self.update(literal)
+
+    def decrease(self, literal: int, size: int) -> None:
+        self.counts[literal] -= 1
+        self.update(literal)
+
+    def resize(self, literal: int, old: int, new: int) -> None:
+        ...
+
+    def occurs(self, variable: int) -> bool:
+        """Whether the variable is in any unsatisfied clause (so unassigned)"""
+        return self.counts[variable] > 0 or self.counts[-variable] > 0
+
+    def polarity(self, variable: int) -> int:
+        """The literal of a variable that occurs most often"""
+        if self.counts[variable] > self.counts[-variable]:
+            return variable
+
+        return -variable
+
+    def update(self, literal: int) -> None:
+        """Recompute the score that changed with the count of a literal"""
+        # NOTE: Implement this function in subclass
+        raise NotImplementedError
+
+    def pick(self) -> Optional[int]:
+        """Return the literal to branch on"""
+        # NOTE: Implement this function in subclass
+        raise NotImplementedError
+
+
+class RandomHeuristic(IncrementalHeuristic):
+    """Random with equal weights"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Variables in unsatisfied clauses, indexed for O(1) removal and choice
+        self.variables: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def update(self, literal: int) -> None:
+        variable = abs(literal)
+        occurs = self.occurs(variable)
+
+        if occurs and variable not in self.positions:
+            self.positions[variable] = len(self.variables)
+            self.variables.append(variable)
+        elif not occurs and variable in self.positions:
+            # Move the last variable into the place of the removed one
+            position = self.positions.pop(variable)
+            last = self.variables.pop()
+            if last != variable:
+                self.variables[position] = last
+                self.positions[last] = position
+
+    def pick(self) -> Optional[int]:
+        if not self.variables:
+            return None
+
+        return random.choice(self.variables)
+
+
+class WeightedHeuristic(IncrementalHeuristic):
+    """Random with weighting by amount of occurences"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.literals: List[int] = []
+        self.positions: Dict[int, int] = {}
+        self.heap: ScoreHeap[int] = ScoreHeap()
+
+    def update(self, literal: int) -> None:
+        count = self.counts[literal]
+        self.heap.update(literal, count)
+
+        if count > 0 and literal not in self.positions:
+            self.positions[literal] = len(self.literals)
+            self.literals.append(literal)
+        elif count == 0 and literal in self.positions:
+            position = self.positions.pop(literal)
+            last = self.literals.pop()
+            if last != literal:
+                self.literals[position] = last
+                self.positions[last] = position
+
+    def pick(self) -> Optional[int]:
+        most_common = self.heap.best(lambda literal: self.counts[literal] > 0)
+        if most_common is None:
+            return None
+
+        # Rejection sampling, accepting a literal proportional to its count
+        max_count = self.counts[most_common]
+        while True:
+            literal = random.choice(self.literals)
+            if random.random() * max_count < self.counts[literal]:
+                return literal
+
+
+class DLISHeuristic(IncrementalHeuristic):
+    """Dynamic largest individual sum"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.heap: ScoreHeap[int] = ScoreHeap()
+
+    def update(self, literal: int) -> None:
+        self.heap.update(literal, self.counts[literal])
+
+    def pick(self) -> Optional[int]:
+        return self.heap.best(lambda literal: self.counts[literal] > 0)
+
+
+class DLCSHeuristic(IncrementalHeuristic):
+    """Dynamic largest combined sum"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.heap: ScoreHeap[int] = ScoreHeap()
+
+    def update(self, literal: int) -> None:
+        variable = abs(literal)
+        self.heap.update(variable, self.counts[variable] + self.counts[-variable])
+
+    def pick(self) -> Optional[int]:
+        variable = self.heap.best(self.occurs)
+        if variable is None:
+            return None
+
+        return self.polarity(variable)
+
+
+class JWHeuristic(IncrementalHeuristic):
+    """Jeroslow-Wang one-sided"""
+
+    size_sensitive = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Sum of 2^-length over the clauses a literal is in
+        self.weights: DefaultDict[int, float] = defaultdict(float)
+        self.heap: ScoreHeap[int] = ScoreHeap()
+
+    def increase(self, literal: int, size: int) -> None:
+        self.weights[literal] += 2.0 ** -size
+        super().increase(literal, size)
+
+    def decrease(self, literal: int, size: int) -> None:
+        self.weights[literal] -= 2.0 ** -size
+        super().decrease(literal, size)
+
+    def resize(self, literal: int, old: int, new: int) -> None:
+        self.weights[literal] += 2.0 ** -new - 2.0 ** -old
+        self.update(literal)
+
+    def update(self, literal: int) -> None:
+        self.heap.update(literal, self.weights[literal])
+
+    def pick(self) -> Optional[int]:
+        return self.heap.best(lambda literal: self.counts[literal] > 0)
+
+
+class JWTwoHeuristic(JWHeuristic):
+    """Jeroslow-Wang two-sided"""
+
+    def update(self, literal: int) -> None:
+        variable = abs(literal)
+        self.heap.update(variable, self.weights[variable] + self.weights[-variable])
+
+    def pick(self) -> Optional[int]:
+        variable = self.heap.best(self.occurs)
+        if variable is None:
+            return None
+
+        if self.weights[-variable] > self.weights[variable]:
+            return -variable
+
+        return variable
+
+
+class MOMSHeuristic(IncrementalHeuristic):
+    """Maximum occurence in clauses of minimum size"""
+
+    size_sensitive = True
+
+    def __init__(self, k: int = 2) -> None:
+        super().__init__()
+        self.k = k
+        # Per clause size the counts of literals and the amount of clauses
+        self.size_counts: DefaultDict[int, DefaultDict[int, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        self.clause_sizes: DefaultDict[int, int] = defaultdict(int)
+        self.heaps: DefaultDict[int, ScoreHeap[int]] = defaultdict(ScoreHeap)
+
+    def satisfied(self, literals: List[int], size: int) -> None:
+        self.clause_sizes[size] -= 1
+        super().satisfied(literals, size)
+
+    def unsatisfied(self, literals: List[int], size: int) -> None:
+        self.clause_sizes[size] += 1
+        super().unsatisfied(literals, size)
+
+    def shortened(self, index: int, literal: int, size: int) -> None:
+        self.clause_sizes[size] -= 1
+        self.clause_sizes[size - 1] += 1
+        super().shortened(index, literal, size)
+
+    def lengthened(self, index: int, literal: int, size: int) -> None:
+        self.clause_sizes[size] += 1
+        self.clause_sizes[size - 1] -= 1
+        super().lengthened(index, literal, size)
+
+    def increase(self, literal: int, size: int) -> None:
+        self.size_counts[size][literal] += 1
+        self.update_size(literal, size)
+        super().increase(literal, size)
+
+    def decrease(self, literal: int, size: int) -> None:
+        self.size_counts[size][literal] -= 1
+        self.update_size(literal, size)
+        super().decrease(literal, size)
+
+    def resize(self, literal: int, old: int, new: int) -> None:
+        self.size_counts[old][literal] -= 1
+        self.size_counts[new][literal] += 1
+        self.update_size(literal, old)
+        self.update_size(literal, new)
+
+    def update(self, literal: int) -> None:
+        # Scores only depend on the counts per size
+        ...
+
+    def update_size(self, literal: int, size: int) -> None:
+        variable = abs(literal)
+        count_pos = self.size_counts[size][variable]
+        count_neg = self.size_counts[size][-variable]
+        score = (count_pos + count_neg) * 2 ** self.k + count_pos * count_neg
+        self.heaps[size].update(variable, score)
+
+    def min_size(self) -> Optional[int]:
+        """Size of the smallest unsatisfied clause"""
+        sizes = [size for size, count in self.clause_sizes.items() if count > 0]
+
+        return min(sizes) if sizes else None
+
+    def pick(self) -> Optional[int]:
+        size = self.min_size()
+        if size is None:
+            return None
+
+        counts = self.size_counts[size]
+        variable = self.heaps[size].best(
+            lambda variable: counts[variable] > 0 or counts[-variable] > 0
+        )
+        if variable is None:
+            return None
+
+        if counts[variable] >= counts[-variable]:
+            return variable
+
+        return -variable
+
+
+class MAMSHeuristic(MOMSHeuristic):
+    """DLIS plus MOMS"""
+
+    def update(self, literal: int) -> None:
+        # The overall count of a positive literal is part of the score at every size
+        if literal > 0:
+            for size in self.heaps:
+                self.update_size(literal, size)
+
+    def update_size(self, literal: int, size: int) -> None:
+        # A new size gets a heap with every variable, as all of them have a score
+        if size not in self.heaps:
+            heap = self.heaps[size]
+            for variable in {abs(literal) for literal in self.counts}:
+                heap.update(variable, self.counts[variable])
+
+        variable = abs(literal)
+        score = self.counts[variable] + self.size_counts[size][-variable]
+        self.heaps[size].update(variable, score)
+
+    def pick(self) -> Optional[int]:
+        size = self.min_size()
+        if size is None:
+            return None
+
+        variable = self.heaps[size].best(self.occurs)
+        if variable is not None:
+            return variable
+
+        # Every variable scores zero at this size, any of them will do
+        for literal, count in self.size_counts[size].items():
+            if count > 0:
+                return abs(literal)
+
+        return None
+
+
+class LookaheadHeuristic(JWTwoHeuristic):
+    """Lookahead, the candidates with the highest two-sided Jeroslow-Wang
+    weight are propagated on the database itself and ranked by the clauses
+    they reduce, see `sattools.lookahead`. The negation of a failed literal
+    is implied at the current decision level, so it holds until the search
+    backtracks above that level and is never branched on."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Clauses shortened by the current probe, None when not probing
+        self.reduced: Optional[Set[int]] = None
+
+    def shortened(self, index: int, literal: int, size: int) -> None:
+        if self.reduced is not None:
+            self.reduced.add(index)
+        super().shortened(index, literal, size)
+
+    def update(self, literal: int) -> None:
+        # Probes are undone right away, so the heap can be left as it was
+        if self.reduced is None:
+            super().update(literal)
+
+    def probe(self, literal: int) -> Optional[int]:
+        """Assign and propagate the literal on a new level and undo it again,
+        returns the amount of clauses reduced or None on a conflict"""
+        database = self.database
+        level = database.level
+
+        self.reduced = set()
+        database.new_level()
+        database.assign(literal)
+
+        reduction = None
+        if database.propagate():
+            true_count = database.true_count
+            reduction = sum(1 for index in self.reduced if true_count[index] == 0)
+
+        database.backjump(level)
+        self.reduced = None
+
+        return reduction
+
+    def fix(self, literal: int) -> bool:
+        """Assign the negation of a failed literal on the current level, False
+        when that leads to a conflict as well"""
+        database = self.database
+        database.assign(-literal)
+
+        return database.propagate()
+
+    def pick(self) -> Optional[int]:
+        """Literal to branch on, or None when the negations of failed literals
+        were assigned and led to a conflict or left no candidate, which the
+        search then finds by propagating"""
+        database = self.database
+
+        scores = self.heap.scores
+        candidates = heapq.nlargest(
+            CANDIDATES, filter(self.occurs, scores), key=scores.get
+        )
+
+        fixed = False
+        best_literal = None
+        best_score = -1
+
+        for variable in candidates:
+            # Fixed by a failed literal in the meantime
+            if database.value(variable) is not None:
+                continue
+
+            positive = self.probe(variable)
+            negative = self.probe(-variable)
+
+            if positive is None and negative is None:
+                # Every branch below this point leads to a conflict, fixing
+                # either literal makes the search find it
+                self.fix(variable)
+                return None
+
+            if positive is None or negative is None:
+                fixed = True
+                if not self.fix(variable if positive is None else -variable):
+                    return None
+                continue
+
+            score = 1024 * positive * negative + positive + negative
+            if score > best_score:
+                best_score = score
+                best_literal = variable if positive >= negative else -variable
+
+        if fixed and (best_literal is None or database.value(best_literal) is not None):
+            return None
+
+        return best_literal
+
+
+class VSIDSHeuristic(IncrementalHeuristic):
+    """Variable state independent decaying sum, variables in conflicts get
+    bumped and older bumps decay."""
+
+    def __init__(self, decay: float = 0.95) -> None:
+        super().__init__()
+        self.decay = decay
+        self.activity: DefaultDict[int, float] = defaultdict(float)
+        self.activity_inc = 1.0
+        self.heap: ScoreHeap[int] = ScoreHeap()
+
+    def conflict(self, index: int) -> None:
+        for literal in self.database.clauses[index]:
+            variable = abs(literal)
+            self.activity[variable] += self.activity_inc
+            self.heap.update(variable, self.activity[variable])
+
+        self.activity_inc /= self.decay
+
+        # Rescale to prevent floats from overflowing
+        if self.activity_inc > 1e100:
+            for variable in self.activity:
+                self.activity[variable] *= 1e-100
+                self.heap.update(variable, self.activity[variable])
+            self.activity_inc *= 1e-100
+
+    def update(self, literal: int) -> None:
+        # Variables coming back into play need an entry in the heap again
+        variable = abs(literal)
+        if self.counts[variable] + self.counts[-variable] == 1:
+            self.heap.push(variable)
+
+    def pick(self) -> Optional[int]:
+        variable = self.heap.best(self.occurs)
+        if variable is None:
+            return None
+
+        return self.polarity(variable)
+
+
+def get_available_incremental_heuristics() -> Dict[str, Type[IncrementalHeuristic]]:
+    return {
+        "dlcs": DLCSHeuristic,
+        "dlis": DLISHeuristic,
+        "jw": JWHeuristic,
+        "jwtwo": JWTwoHeuristic,
+        "lookahead": LookaheadHeuristic,
+        "mams": MAMSHeuristic,
+        "moms": MOMSHeuristic,
+        "random": RandomHeuristic,
+        "vsids": VSIDSHeuristic,
+        "weighted": WeightedHeuristic,
+    }
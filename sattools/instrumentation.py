@@ -0,0 +1,97 @@
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+
+Progress = Callable[[Dict[str, Any]], None]
+
+
+class Metrics:
+    """Counters and timers that a solver fills in while solving.
+
+    Solvers only touch these when they were given a Metrics, so leaving it
+    out costs no more than a check for None. Timers are cumulative seconds
+    spent in simplification (unit propagation and pure literals), picking a
+    literal and branching (making or undoing assignments). With a `progress`
+    callback the solver reports its state at most once every `interval`
+    seconds. Peak memory is only measured with `trace_memory`, as tracemalloc
+    slows everything down considerably.
+    """
+
+    def __init__(
+        self,
+        progress: Optional[Progress] = None,
+        interval: float = 1.0,
+        trace_memory: bool = False,
+    ) -> None:
+        self.progress = progress
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.reset()
+
+    def reset(self) -> None:
+        self.decisions = 0
+        self.conflicts = 0
+        self.max_depth = 0
+        self.peak_cnf_size = 0
+
+        self.simplify_time = 0.0
+        self.heuristic_time = 0.0
+        self.branch_time = 0.0
+
+        self.peak_memory: Optional[int] = None
+        self.next_report = 0.0
+        # Whether tracemalloc was started by this instance
+        self.tracing = False
+
+    def start(self) -> None:
+        """Called by the solver right before solving"""
+        self.reset()
+        self.next_report = perf_counter() + self.interval
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+    def stop(self) -> None:
+        """Called by the solver right after solving"""
+        if self.tracing:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.tracing = False
+
+    def visit(self, depth: int, cnf_size: Optional[int] = None, **state: Any) -> None:
+        """Register a node of the search tree, and report on the progress if
+        it is time to. The state is passed on to the progress callback."""
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if cnf_size is not None and cnf_size > self.peak_cnf_size:
+            self.peak_cnf_size = cnf_size
+
+        if self.progress is not None:
+            now = perf_counter()
+            if now >= self.next_report:
+                self.next_report = now + self.interval
+                current = dict(depth=depth, cnf_size=cnf_size)
+                self.progress({**state, **current, **self.as_dict()})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(
+            decisions=self.decisions,
+            conflicts=self.conflicts,
+            max_depth=self.max_depth,
+            peak_cnf_size=self.peak_cnf_size,
+            simplify_time=self.simplify_time,
+            heuristic_time=self.heuristic_time,
+            branch_time=self.branch_time,
+            peak_memory=self.peak_memory,
+        )
+
+
+def print_progress(state: Dict[str, Any]) -> None:
+    """Progress callback printing the counters, like `verbose` used to"""
+    info_strings = [
+        f"{value:5} {key.replace('_', ' ')}"
+        for key, value in state.items()
+        if isinstance(value, int)
+    ]
+    print(", ".join(info_strings))
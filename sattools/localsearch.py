@@ -0,0 +1,270 @@
+import random
+from time import perf_counter
+from typing import Any, List, Optional
+
+from .instrumentation import Metrics
+from .propagation import WatchedLiterals
+from .solvers import Solver
+from .utils import CNFtype
+
+
+class LocalSearch(Solver):
+    # Running out of flips says nothing about satisfiability, `start` sets it
+    # for the instance when propagation alone proves the cnf unsatisfiable
+    complete = False
+
+    def __init__(
+        self,
+        cnf: CNFtype,
+        verbose: bool = False,
+        identifier: Any = None,
+        algorithm: str = "probsat",
+        max_flips: int = 100000,
+        max_tries: int = 10,
+        noise: float = 0.5,
+        cb: float = 2.06,
+        seed: Optional[int] = None,
+        metrics: Optional[Metrics] = None,
+        preprocess: bool = False,
+    ) -> None:
+        """Stochastic local search, which flips variables of a complete
+        assignment until every clause is satisfied.
+
+        Every flip repairs a random unsatisfied clause. `walksat` flips a
+        variable of that clause that breaks no other clause if there is one,
+        else a random variable with probability `noise` and otherwise the one
+        breaking the fewest. `probsat` picks with probability proportional to
+        (1 + breaks) ** -cb. Break and make counts are kept up to date on
+        every flip. Unit clauses are propagated first, the variables that
+        fixes are never flipped. After `max_flips` flips the search restarts
+        from a new random assignment, at most `max_tries` times. Without a
+        `seed` the global random state is used. Unsatisfiable cnfs can't be
+        proven so, unless propagating the unit clauses already conflicts."""
+        super().__init__(
+            cnf,
+            verbose=verbose,
+            identifier=identifier,
+            metrics=metrics,
+            preprocess=preprocess,
+        )
+
+        algorithms = self.get_available_algorithms()
+        assert algorithm in algorithms, f"algorithm must be one of {algorithms}"
+        self.algorithm = algorithm
+        self.max_flips = max_flips
+        self.max_tries = max_tries
+        self.noise = noise
+        self.cb = cb
+        self.random = random if seed is None else random.Random(seed)
+
+        self.backtrack_count = 0
+        self.propagation_count = 0
+
+    @staticmethod
+    def get_available_algorithms() -> List[str]:
+        return ["probsat", "walksat"]
+
+    def start(self) -> bool:
+        # A restart counts as a backtrack and a flip as a propagation
+        self.backtrack_count = 0
+        self.propagation_count = 0
+
+        if not self.load():
+            # The unit clauses conflict, which is a proof after all
+            self.complete = True
+            return False
+
+        pick = self.pick_walksat if self.algorithm == "walksat" else self.pick_probsat
+        metrics = self.metrics
+
+        for tries in range(self.max_tries):
+            if tries:
+                self.backtrack_count += 1
+            self.initialize()
+
+            for _ in range(self.max_flips):
+                if not self.unsatisfied:
+                    break
+
+                if metrics is not None:
+                    metrics.visit(
+                        tries,
+                        unsatisfied=len(self.unsatisfied),
+                        flips=self.propagation_count,
+                    )
+                    start = perf_counter()
+
+                variable = pick()
+
+                if metrics is not None:
+                    metrics.heuristic_time += perf_counter() - start
+                    metrics.decisions += 1
+                    start = perf_counter()
+
+                self.flip(variable)
+                self.propagation_count += 1
+
+                if metrics is not None:
+                    metrics.branch_time += perf_counter() - start
+
+            if not self.unsatisfied:
+                flipped = [
+                    variable if value else -variable
+                    for variable, value in zip(self.variables, self.values)
+                ]
+                # Variables left in no clause after propagation are taken false
+                assigned = {abs(literal) for literal in self.fixed + flipped}
+                others = [-v for v in self.literals if v not in assigned]
+                self.set_solution(self.fixed + flipped + others)
+                return True
+
+        if self.verbose:
+            print(f"Gave up after {self.max_tries} tries of {self.max_flips} flips")
+
+        return False
+
+    def load(self) -> bool:
+        """Propagate the unit clauses and build occurrence lists of the clauses
+        that are left over the free variables, returns False on a conflict"""
+        engine = WatchedLiterals(self.cnf)
+        if not engine.propagate():
+            return False
+        # Flipping these could only break the clauses that fixed them
+        self.fixed: List[int] = list(engine.trail)
+
+        residual = engine.residual_cnf()
+        # Literal codes are 2 * index for a variable and 2 * index + 1 for its
+        # negation, so the index of a code is code >> 1
+        self.variables = sorted({abs(l) for clause in residual for l in clause})
+        index = {variable: i for i, variable in enumerate(self.variables)}
+
+        def code(literal: int) -> int:
+            return 2 * index[abs(literal)] + (literal < 0)
+
+        self.clauses: List[List[int]] = []
+        self.occurrences: List[List[int]] = [[] for _ in range(2 * len(index))]
+
+        for clause in residual:
+            codes = [code(literal) for literal in clause]
+            for literal in codes:
+                self.occurrences[literal].append(len(self.clauses))
+            self.clauses.append(codes)
+
+        # Probabilities of probSAT by amount of breaks, longer ones are computed
+        self.weights = [(1 + breaks) ** -self.cb for breaks in range(64)]
+
+        return True
+
+    def initialize(self) -> None:
+        """Start from a random assignment of the free variables"""
+        draw = self.random.random
+        self.values: List[bool] = [draw() < 0.5 for _ in self.variables]
+
+        values = self.values
+        n_variables = len(values)
+        n_clauses = len(self.clauses)
+
+        # Per clause its amount of true literals and the sum of their
+        # variables, which is the only true variable when the amount is one
+        self.true_count = [0] * n_clauses
+        self.true_sum = [0] * n_clauses
+        # Clauses a flip would make unsatisfied or satisfied, per variable
+        self.breaks = [0] * n_variables
+        self.makes = [0] * n_variables
+        # Unsatisfied clauses and their position in that list (-1 if satisfied)
+        self.unsatisfied: List[int] = []
+        self.position = [-1] * n_clauses
+
+        for c, clause in enumerate(self.clauses):
+            for literal in clause:
+                if values[literal >> 1] != literal & 1:
+                    self.true_count[c] += 1
+                    self.true_sum[c] += literal >> 1
+
+            if self.true_count[c] == 0:
+                self.position[c] = len(self.unsatisfied)
+                self.unsatisfied.append(c)
+                for literal in clause:
+                    self.makes[literal >> 1] += 1
+            elif self.true_count[c] == 1:
+                self.breaks[self.true_sum[c]] += 1
+
+    def flip(self, variable: int) -> None:
+        """Flip a variable, updating the clause and variable counters"""
+        self.values[variable] = value = not self.values[variable]
+        true_literal = 2 * variable + (not value)
+
+        clauses = self.clauses
+        true_count = self.true_count
+        true_sum = self.true_sum
+        breaks = self.breaks
+        makes = self.makes
+        unsatisfied = self.unsatisfied
+        position = self.position
+
+        for c in self.occurrences[true_literal]:
+            count = true_count[c]
+            if count == 0:
+                # Satisfied by this variable only, remove it from the list
+                last = unsatisfied.pop()
+                if last != c:
+                    unsatisfied[position[c]] = last
+                    position[last] = position[c]
+                position[c] = -1
+
+                for literal in clauses[c]:
+                    makes[literal >> 1] -= 1
+                breaks[variable] += 1
+            elif count == 1:
+                # The other variable is no longer the only one
+                breaks[true_sum[c]] -= 1
+
+            true_count[c] = count + 1
+            true_sum[c] += variable
+
+        for c in self.occurrences[true_literal ^ 1]:
+            count = true_count[c] - 1
+            true_count[c] = count
+            true_sum[c] -= variable
+
+            if count == 0:
+                position[c] = len(unsatisfied)
+                unsatisfied.append(c)
+
+                for literal in clauses[c]:
+                    makes[literal >> 1] += 1
+                breaks[variable] -= 1
+            elif count == 1:
+                # The remaining true variable is now the only one
+                breaks[true_sum[c]] += 1
+
+    def pick_walksat(self) -> int:
+        """Variable of a random unsatisfied clause, by breaks and then makes"""
+        rng = self.random
+        clause = self.clauses[rng.choice(self.unsatisfied)]
+        variables = [literal >> 1 for literal in clause]
+        breaks = self.breaks
+
+        fewest = min(breaks[variable] for variable in variables)
+        if fewest > 0 and rng.random() < self.noise:
+            return rng.choice(variables)
+
+        makes = self.makes
+        candidates = [v for v in variables if breaks[v] == fewest]
+        most = max(makes[v] for v in candidates)
+
+        return rng.choice([v for v in candidates if makes[v] == most])
+
+    def pick_probsat(self) -> int:
+        """Variable of a random unsatisfied clause, less breaks more likely"""
+        rng = self.random
+        clause = self.clauses[rng.choice(self.unsatisfied)]
+        variables = [literal >> 1 for literal in clause]
+
+        table = self.weights
+        weights = [
+            table[b] if b < len(table) else (1 + b) ** -self.cb
+            for b in (self.breaks[variable] for variable in variables)
+        ]
+
+        return rng.choices(variables, weights)[0]
@@ -0,0 +1,150 @@
+import heapq
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Optional, Set
+
+# Amount of variables that are looked ahead on, by Jeroslow-Wang weight
+CANDIDATES = 128
+
+
+class Lookahead:
+    """Trial propagation of literals on a cnf, without building a new cnf.
+
+    Candidate variables are preselected by their Jeroslow-Wang weight. Each
+    of their literals is assigned on its own and propagated, it reduces the
+    cnf by the clauses it shortens but does not satisfy. The variable with
+    the largest product of the reductions of both its literals is the best to
+    branch on. A literal whose propagation leads to a conflict is failed, its
+    negation holds in the whole subtree and is fixed for the other probes.
+    """
+
+    def __init__(self, cnf: Iterable[Iterable[int]]) -> None:
+        self.clauses: List[List[int]] = [list(clause) for clause in cnf]
+        # Maps a literal to the clauses (by index) it occurs in
+        self.occurrences: DefaultDict[int, List[int]] = defaultdict(list)
+        self.weights: DefaultDict[int, float] = defaultdict(float)
+
+        for index, clause in enumerate(self.clauses):
+            weight = 2.0 ** -len(clause)
+            for literal in clause:
+                self.occurrences[literal].append(index)
+                self.weights[abs(literal)] += weight
+
+        # Negations of the failed literals found so far
+        self.fixed: List[int] = []
+        self.failed: List[int] = []
+
+    def probe(self, literal: int) -> Optional[int]:
+        """Propagate the literal together with the fixed ones, returns the
+        amount of clauses reduced or None on a conflict"""
+        clauses = self.clauses
+        occurrences = self.occurrences
+
+        true: Set[int] = set()
+        satisfied: Set[int] = set()
+        # Unassigned literals left in the shortened clauses
+        free: Dict[int, int] = {}
+
+        queue = [*self.fixed, literal]
+        while queue:
+            current = queue.pop()
+            if current in true:
+                continue
+            if -current in true:
+                return None
+
+            true.add(current)
+            satisfied.update(occurrences[current])
+
+            for index in occurrences[-current]:
+                if index in satisfied:
+                    continue
+
+                count = free.get(index, len(clauses[index])) - 1
+                free[index] = count
+                if count == 0:
+                    return None
+                if count == 1:
+                    # Unit, its last literal has to be true
+                    for other in clauses[index]:
+                        if other not in true and -other not in true:
+                            queue.append(other)
+                            break
+
+        return sum(1 for index in free if index not in satisfied)
+
+    def best(self, candidates: Optional[int] = None) -> int:
+        """Literal to branch on, the negation of a failed literal if any. The
+        side with the largest reduction goes first."""
+        candidates = candidates or CANDIDATES
+        weights = self.weights
+        best_literal = 0
+        best_score = -1
+
+        for variable in heapq.nlargest(candidates, weights, key=weights.get):
+            positive = self.probe(variable)
+            negative = self.probe(-variable)
+
+            if positive is None and negative is None:
+                # Every branch below this point leads to a conflict
+                return variable
+
+            if positive is None or negative is None:
+                literal = variable if positive is None else -variable
+                self.failed.append(literal)
+                self.fixed.append(-literal)
+                continue
+
+            score = 1024 * positive * negative + positive + negative
+            if score > best_score:
+                best_score = score
+                best_literal = variable if positive >= negative else -variable
+
+        if self.failed:
+            return -self.failed[0]
+
+        return best_literal
+
+
+def lookahead(cnf: Iterable[Iterable[int]]) -> int:
+    """Literal to branch on by lookahead, see `Lookahead`. Nothing is kept
+    between calls, a search keeps its failed literals in a `LookaheadCache`."""
+    return Lookahead(cnf).best()
+
+
+class LookaheadCache:
+    """Lookahead for a single search, which keeps the failed literals that
+    were not branched on yet by the decision level they were found at.
+
+    A literal that fails at a node also fails in its whole subtree, so the
+    next lookahead below it branches on its negation right away instead of
+    probing all candidates again. Once the search is back at the level of
+    the node, or above it, the literals belong to a subtree that is done and
+    are dropped.
+    """
+
+    def __init__(self) -> None:
+        self.failed: Dict[int, List[int]] = {}
+
+    def pick(self, cnf: Iterable[Iterable[int]], level: int) -> int:
+        """Literal to branch on at the given decision level"""
+        for done in [other for other in self.failed if other >= level]:
+            del self.failed[done]
+
+        search = Lookahead(cnf)
+
+        # Deepest first, and the ones of a level in the order they were found
+        for found in sorted(self.failed, reverse=True):
+            failed = self.failed[found]
+            while failed:
+                literal = failed.pop()
+                # Already assigned by propagation in the meantime
+                if abs(literal) not in search.weights:
+                    continue
+                if search.probe(literal) is None:
+                    return -literal
+
+        literal = search.best()
+        if len(search.failed) > 1:
+            self.failed[level] = list(reversed(search.failed[1:]))
+
+        return literal
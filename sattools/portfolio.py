@@ -0,0 +1,172 @@
+import multiprocessing as mp
+import random
+from queue import Empty
+from time import time
+from typing import Any, Dict, List, Optional
+
+from .instrumentation import Metrics
+from .localsearch import LocalSearch
+from .solvers import Solver, get_solver
+from .utils import CNFtype
+
+Configuration = Dict[str, Any]
+
+
+class Portfolio(Solver):
+    def __init__(
+        self,
+        cnf: CNFtype,
+        verbose: bool = False,
+        identifier: Any = None,
+        configurations: Optional[List[Configuration]] = None,
+        timeout: Optional[float] = None,
+        metrics: Optional[Metrics] = None,
+        preprocess: bool = False,
+    ) -> None:
+        """Races several solver configurations on the same cnf, each in its own
+        process. The first one to finish gives the answer, the others are
+        stopped. A configuration is a dict with the `solver` name (default
+        dpll), an optional random `seed` and the keyword arguments of the
+        solver, e.g. {"heuristic": "jw"}. The winner is stored in `winner`."""
+        super().__init__(
+            cnf,
+            verbose=verbose,
+            identifier=identifier,
+            metrics=metrics,
+            preprocess=preprocess,
+        )
+
+        if configurations is None:
+            configurations = self.get_default_configurations()[: mp.cpu_count()]
+        assert configurations, "a portfolio needs at least one configuration"
+        self.configurations = configurations
+        self.timeout = timeout
+
+        self.winner: Optional[Configuration] = None
+        self.backtrack_count = 0
+        self.propagation_count = 0
+
+    @staticmethod
+    def get_default_configurations() -> List[Configuration]:
+        """Heuristics with rather different runtimes, best first"""
+        return [
+            dict(solver="cdcl"),
+            dict(heuristic="jw"),
+            dict(heuristic="moms"),
+            dict(heuristic="dlcs"),
+            dict(heuristic="random", seed=0),
+            dict(heuristic="dlis"),
+            dict(heuristic="random", seed=1),
+            dict(heuristic="jwtwo"),
+            dict(solver="localsearch", algorithm="probsat", seed=0),
+        ]
+
+    def start(self) -> bool:
+        context = mp.get_context()
+        results = context.Queue()
+
+        processes = [
+            context.Process(
+                target=run_configuration,
+                args=(self.cnf, configuration, index, results),
+                daemon=True,
+            )
+            for index, configuration in enumerate(self.configurations)
+        ]
+        for process in processes:
+            process.start()
+
+        deadline = None if self.timeout is None else time() + self.timeout
+        result = None
+        try:
+            # Configurations that raised or gave up report None, the next one
+            # may still finish
+            for _ in processes:
+                remaining = None if deadline is None else max(deadline - time(), 0)
+                index, result = results.get(timeout=remaining)
+                if result is not None:
+                    break
+        except Empty:
+            result = None
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+            results.close()
+
+        if result is None:
+            if self.verbose:
+                print("No configuration of the portfolio finished")
+            return False
+
+        self.winner = self.configurations[index]
+        self.backtrack_count = result["backtrack_count"]
+        self.propagation_count = result["propagation_count"]
+        self.set_solution(result["solution"])
+
+        if self.verbose:
+            print(f"Won by {describe_configuration(self.winner)}")
+
+        return result["satisfied"]
+
+
+def run_configuration(
+    cnf: CNFtype, configuration: Configuration, index: int, results: Any
+) -> None:
+    """Solve with a single configuration and put the outcome on the queue"""
+    try:
+        kwargs = dict(configuration)
+        solver_class = get_solver(kwargs.pop("solver", "dpll"))
+        seed = kwargs.pop("seed", None)
+        if seed is not None:
+            random.seed(seed)
+
+        solver = solver_class(cnf, **kwargs)
+        solver.solve()
+        result = dict(
+            satisfied=solver.satisfied,
+            solution=solver.solution,
+            backtrack_count=solver.backtrack_count,
+            propagation_count=solver.propagation_count,
+        )
+        # Incomplete solvers that give up do not know the answer either
+        if not solver.satisfied and not solver.complete:
+            result = None
+    except Exception as error:
+        print(f"{describe_configuration(configuration)} raised {error!r}")
+        result = None
+
+    results.put((index, result))
+
+
+def describe_configuration(configuration: Configuration) -> str:
+    """E.g. `dpll heuristic=random seed=1`"""
+    options = {**configuration}
+    solver = options.pop("solver", "dpll")
+
+    return " ".join([solver, *(f"{key}={value}" for key, value in options.items())])
+
+
+def parse_configuration(text: str, **defaults: Any) -> Configuration:
+    """Parse a configuration given as `solver`, `heuristic`, a local search
+    algorithm or any of those with `:seed`, the defaults only apply to DPLL
+    configurations"""
+    name, _, seed = text.partition(":")
+
+    configuration: Configuration = {}
+    if name in ("cdcl", "dpll"):
+        configuration["solver"] = name
+    elif name in LocalSearch.get_available_algorithms():
+        configuration.update(solver="localsearch", algorithm=name)
+    else:
+        configuration["heuristic"] = name
+    if seed:
+        configuration["seed"] = int(seed)
+
+    if configuration.get("solver", "dpll") == "dpll":
+        for key, value in defaults.items():
+            configuration.setdefault(key, value)
+
+    return configuration
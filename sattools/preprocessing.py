@@ -0,0 +1,270 @@
+from collections import defaultdict
+from time import time
+from typing import Any, DefaultDict, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from .propagation import WatchedLiterals
+from .utils import CNFtype
+
+Clause = FrozenSet[int]
+
+
+class Preprocessor:
+    """Simplifies a cnf before it is handed to a solver.
+
+    Four techniques are applied in rounds until the cnf stops shrinking:
+    unit propagation, (backward) subsumption together with self-subsuming
+    strengthening, failed-literal probing and bounded variable elimination.
+    A variable is only eliminated when the resolvents of its clauses are not
+    more than the clauses themselves. The removed clauses are kept so that
+    `reconstruct` can extend a solution of the simplified cnf to one of the
+    original cnf.
+    """
+
+    def __init__(
+        self,
+        cnf: Iterable[Iterable[int]],
+        probing: bool = True,
+        elimination: bool = True,
+        max_occurrences: int = 16,
+        max_rounds: int = 3,
+    ) -> None:
+        self.probing = probing
+        self.elimination = elimination
+        # Variables occurring more often are not worth trying to eliminate
+        self.max_occurrences = max_occurrences
+        self.max_rounds = max_rounds
+
+        self.clauses: Dict[int, Clause] = {}
+        # Maps a literal to the clauses (by index) it occurs in
+        self.occurrences: DefaultDict[int, Set[int]] = defaultdict(set)
+        self.next_index = 0
+        # Clauses that were added since the last subsumption check
+        self.added: List[int] = []
+
+        self.units: List[int] = []
+        self.fixed: Set[int] = set()
+        self.unsatisfiable = False
+        # Eliminated variables with the clauses they occurred in, in order
+        self.eliminated: List[Tuple[int, List[Clause]]] = []
+
+        self.stats: Dict[str, Any] = dict(
+            subsumed=0, strengthened=0, failed_literals=0, eliminated_variables=0
+        )
+
+        for clause in cnf:
+            self.add(frozenset(clause))
+
+        self.variables = {abs(literal) for literal in self.occurrences}
+        self.variables.update(abs(literal) for literal in self.units)
+
+    def add(self, clause: Clause) -> None:
+        """Add a clause, units are assigned instead of stored"""
+        if any(-literal in clause for literal in clause):
+            return
+
+        if len(clause) == 0:
+            self.unsatisfiable = True
+        elif len(clause) == 1:
+            self.units.extend(clause)
+        else:
+            index = self.next_index
+            self.next_index += 1
+
+            self.clauses[index] = clause
+            for literal in clause:
+                self.occurrences[literal].add(index)
+            self.added.append(index)
+
+    def remove(self, index: int) -> Clause:
+        clause = self.clauses.pop(index)
+        for literal in clause:
+            self.occurrences[literal].discard(index)
+
+        return clause
+
+    def run(self) -> CNFtype:
+        """Simplify the cnf, returns the simplified cnf"""
+        duration = time()
+        n_clauses = len(self.clauses) + len(self.units)
+        n_variables = len(self.variables)
+
+        for _ in range(self.max_rounds):
+            size = (len(self.clauses), len(self.fixed), len(self.eliminated))
+
+            self.propagate()
+            self.subsume()
+            if self.probing:
+                self.probe()
+            if self.elimination:
+                self.eliminate()
+                self.subsume()
+
+            if self.unsatisfiable:
+                break
+            if size == (len(self.clauses), len(self.fixed), len(self.eliminated)):
+                break
+
+        cnf = self.to_cnf()
+        remaining = {abs(literal) for clause in cnf for literal in clause}
+        self.stats.update(
+            clauses_before=n_clauses,
+            clauses_after=len(cnf),
+            variables_before=n_variables,
+            variables_after=len(remaining),
+            fixed_variables=len(self.fixed),
+            preprocess_duration=time() - duration,
+        )
+
+        return cnf
+
+    def to_cnf(self) -> CNFtype:
+        if self.unsatisfiable:
+            return [set()]
+
+        return [set(clause) for clause in self.clauses.values()]
+
+    def propagate(self) -> None:
+        """Assign the pending units, removing satisfied clauses and false literals"""
+        while self.units and not self.unsatisfiable:
+            literal = self.units.pop()
+            if -literal in self.fixed:
+                self.unsatisfiable = True
+                return
+            if literal in self.fixed:
+                continue
+            self.fixed.add(literal)
+
+            for index in list(self.occurrences[literal]):
+                self.remove(index)
+            for index in list(self.occurrences[-literal]):
+                self.add(self.remove(index) - {-literal})
+
+    def subsume(self) -> None:
+        """Remove clauses containing another clause, and remove a literal from
+        a clause when another clause equals it apart from that literal negated"""
+        clauses = self.clauses
+        occurrences = self.occurrences
+
+        while self.added and not self.unsatisfiable:
+            # Smaller clauses subsume more, so they go first
+            added = sorted(
+                (i for i in self.added if i in clauses), key=lambda i: len(clauses[i])
+            )
+            self.added = []
+
+            for index in added:
+                if index not in clauses:
+                    continue
+                clause = clauses[index]
+
+                # Any clause containing this one contains its rarest literal
+                rarest = min(clause, key=lambda literal: len(occurrences[literal]))
+                for other in list(occurrences[rarest]):
+                    if other != index and clause <= clauses[other]:
+                        self.remove(other)
+                        self.stats["subsumed"] += 1
+
+                for literal in clause:
+                    rest = clause - {literal}
+                    for other in list(occurrences[-literal]):
+                        if other in clauses and rest <= clauses[other]:
+                            self.add(self.remove(other) - {-literal})
+                            self.stats["strengthened"] += 1
+
+                    if index not in clauses:
+                        break
+
+            self.propagate()
+
+    def probe(self) -> None:
+        """Assign every literal on its own, if that leads to a conflict its
+        negation has to hold"""
+        engine = WatchedLiterals(self.clauses.values())
+        variables = sorted({abs(literal) for literal in self.occurrences})
+
+        for variable in variables:
+            for literal in (variable, -variable):
+                if engine.value(literal) is not None:
+                    continue
+
+                engine.new_level()
+                engine.assign(literal)
+                consistent = engine.propagate()
+                engine.backjump(0)
+
+                if not consistent:
+                    self.stats["failed_literals"] += 1
+                    engine.assign(-literal)
+                    if not engine.propagate():
+                        self.unsatisfiable = True
+                        return
+
+        # Everything implied on the top level becomes a unit
+        self.units.extend(engine.trail)
+        self.propagate()
+        self.subsume()
+
+    def eliminate(self) -> None:
+        """Replace the clauses of a variable by their resolvents, as long as
+        that does not increase the amount of clauses"""
+        occurrences = self.occurrences
+
+        def count(variable: int) -> int:
+            return len(occurrences[variable]) + len(occurrences[-variable])
+
+        candidates = {abs(literal) for literal in occurrences if occurrences[literal]}
+        for variable in sorted(candidates, key=count):
+            if self.unsatisfiable:
+                return
+
+            n_occurrences = count(variable)
+            if n_occurrences == 0 or n_occurrences > self.max_occurrences:
+                continue
+
+            positive = [self.clauses[i] for i in occurrences[variable]]
+            negative = [self.clauses[i] for i in occurrences[-variable]]
+
+            resolvents: List[Clause] = []
+            for p in positive:
+                for n in negative:
+                    resolvent = (p - {variable}) | (n - {-variable})
+                    if not any(-literal in resolvent for literal in resolvent):
+                        resolvents.append(resolvent)
+                if len(resolvents) > n_occurrences:
+                    break
+
+            if len(resolvents) > n_occurrences:
+                continue
+
+            for index in list(occurrences[variable] | occurrences[-variable]):
+                self.remove(index)
+            self.eliminated.append((variable, positive + negative))
+            self.stats["eliminated_variables"] += 1
+
+            for resolvent in resolvents:
+                self.add(resolvent)
+            self.propagate()
+
+    def reconstruct(self, solution: Iterable[int]) -> Set[int]:
+        """Extend a solution of the simplified cnf to the original cnf"""
+        model = set(solution) | self.fixed
+
+        # Variables left open can be anything, false is as good as any
+        for variable in self.variables:
+            if variable not in model and -variable not in model:
+                model.add(-variable)
+
+        # The variable has to be true when a clause needs it, otherwise all
+        # clauses with its negation are satisfied by the resolvents already
+        for variable, clauses in reversed(self.eliminated):
+            model.discard(variable)
+            model.discard(-variable)
+
+            needed = any(
+                variable in clause
+                and not any(literal in model for literal in clause)
+                for clause in clauses
+            )
+            model.add(variable if needed else -variable)
+
+        return model
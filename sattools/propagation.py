@@ -0,0 +1,310 @@
+from collections import defaultdict
+from itertools import chain
+from typing import DefaultDict, Dict, Iterable, List, Optional, Set
+
+from .utils import CNFtype
+
+
+class WatchedLiterals:
+    """Unit propagation using two watched literals per clause.
+
+    Every clause of two or more literals watches two of them. A clause only
+    has to be visited when one of its watched literals becomes false, so an
+    assignment touches just the clauses it can actually affect. Assignments
+    are kept on a trail split in decision levels, which makes undoing them a
+    matter of popping it.
+
+    With `counted` every clause also keeps count of its true literals, like
+    the ClauseDatabase does, so searches that ask for the satisfied clauses,
+    pure literals or the residual cnf at every node don't rescan all clauses.
+    This costs a visit of every clause a true literal occurs in, which
+    solvers that only propagate leave out.
+    """
+
+    def __init__(self, cnf: CNFtype, counted: bool = False) -> None:
+        self.clauses: List[Optional[List[int]]] = []
+        # Maps a literal to the clauses (by index) that are watching it
+        self.watches: DefaultDict[int, List[int]] = defaultdict(list)
+        # Literals that are currently true
+        self.true: Set[int] = set()
+        self.trail: List[int] = []
+        # Trail sizes at the start of every decision level
+        self.trail_lim: List[int] = []
+        # Position in the trail up to which assignments have been propagated
+        self.head = 0
+
+        # Per variable the clause that implied it (None for decisions) and its level
+        self.reasons: Dict[int, Optional[int]] = {}
+        self.levels: Dict[int, int] = {}
+        # Clause that was found conflicting by the last `propagate`
+        self.conflict: Optional[int] = None
+
+        self.units: List[int] = []
+        self.inconsistent = False
+
+        self.counted = counted
+        # Maps a literal to the clauses (by index) it occurs in
+        self.occurrences: DefaultDict[int, List[int]] = defaultdict(list)
+        self.true_count: List[int] = []
+        # Per literal the amount of unsatisfied clauses it occurs in
+        self.literal_count: DefaultDict[int, int] = defaultdict(int)
+        self.unsatisfied: Set[int] = set()
+        # Literals whose count dropped to zero, their negation might be pure
+        self.pure_candidates: Set[int] = set()
+
+        for clause in cnf:
+            self.add_clause(clause)
+
+        # Initially every literal is a candidate
+        self.pure_candidates.update(-literal for literal in self.literal_count)
+
+        # Residual cnf is cached until the trail changes
+        self._residual: Optional[CNFtype] = None
+
+    @property
+    def level(self) -> int:
+        """Current decision level"""
+        return len(self.trail_lim)
+
+    def add_clause(self, clause: Iterable[int]) -> Optional[int]:
+        """Add a clause and start watching its first two literals.
+        Returns the index of the clause, None if it is a tautology."""
+        # Removes duplicates while keeping the order of the literals
+        unique = dict.fromkeys(clause)
+        literals = list(unique)
+
+        # Tautologies are always satisfied and can be ignored
+        if any(-literal in unique for literal in literals):
+            return None
+
+        index = len(self.clauses)
+
+        if len(literals) == 0:
+            self.inconsistent = True
+        elif len(literals) == 1:
+            self.units.append(literals[0])
+        else:
+            self.watches[literals[0]].append(index)
+            self.watches[literals[1]].append(index)
+
+        self.clauses.append(literals)
+
+        if self.counted:
+            true_count = sum(literal in self.true for literal in literals)
+            self.true_count.append(true_count)
+            for literal in literals:
+                self.occurrences[literal].append(index)
+            if true_count == 0:
+                self.unsatisfied.add(index)
+                for literal in literals:
+                    self.literal_count[literal] += 1
+            self._residual = None
+
+        return index
+
+    def remove_clauses(self, indices: Set[int]) -> None:
+        """Remove clauses of two or more literals, which may not be reasons"""
+        if self.counted:
+            literals = set()
+            for index in indices:
+                literals.update(self.clauses[index])
+                if index in self.unsatisfied:
+                    self.unsatisfied.discard(index)
+                    for literal in self.clauses[index]:
+                        self.literal_count[literal] -= 1
+            for literal in literals:
+                occurrences = self.occurrences[literal]
+                self.occurrences[literal] = [i for i in occurrences if i not in indices]
+            self._residual = None
+
+        for index in indices:
+            self.clauses[index] = None
+
+        for literal, watchers in self.watches.items():
+            self.watches[literal] = [i for i in watchers if i not in indices]
+
+    def value(self, literal: int) -> Optional[bool]:
+        """Return the truth value of a literal, None when unassigned"""
+        if literal in self.true:
+            return True
+        if -literal in self.true:
+            return False
+
+        return None
+
+    def assign(self, literal: int, reason: Optional[int] = None) -> None:
+        """Make a literal true, its consequences follow on `propagate`"""
+        self.true.add(literal)
+        self.trail.append(literal)
+        self.reasons[abs(literal)] = reason
+        self.levels[abs(literal)] = len(self.trail_lim)
+        self._residual = None
+
+        if not self.counted:
+            return
+
+        # Clauses containing the literal become satisfied
+        true_count = self.true_count
+        literal_count = self.literal_count
+        for index in self.occurrences[literal]:
+            true_count[index] += 1
+            if true_count[index] == 1:
+                self.unsatisfied.discard(index)
+                for other in self.clauses[index]:
+                    literal_count[other] -= 1
+                    if literal_count[other] == 0:
+                        self.pure_candidates.add(other)
+
+    def undo(self, trail_size: int) -> None:
+        """Undo assignments until the trail has the given size"""
+        true_count = self.true_count
+        literal_count = self.literal_count
+
+        while len(self.trail) > trail_size:
+            literal = self.trail.pop()
+            self.true.discard(literal)
+            self._residual = None
+
+            if not self.counted:
+                continue
+
+            for index in self.occurrences[literal]:
+                true_count[index] -= 1
+                if true_count[index] == 0:
+                    self.unsatisfied.add(index)
+                    for other in self.clauses[index]:
+                        literal_count[other] += 1
+
+        self.head = min(self.head, trail_size)
+        self.pure_candidates.clear()
+
+    def new_level(self) -> None:
+        """Open a new decision level"""
+        self.trail_lim.append(len(self.trail))
+
+    def backjump(self, level: int) -> None:
+        """Undo every assignment made above the given decision level"""
+        if level >= self.level:
+            return
+
+        self.undo(self.trail_lim[level])
+        del self.trail_lim[level:]
+
+    def propagate(self) -> bool:
+        """Propagate all pending assignments, return False on a conflict"""
+        self.conflict = None
+        if self.inconsistent:
+            return False
+
+        # Unit clauses never get watched, so they are (re)checked here
+        for literal in self.units:
+            if -literal in self.true:
+                return False
+            if literal not in self.true:
+                self.assign(literal)
+
+        true = self.true
+        while self.head < len(self.trail):
+            false_literal = -self.trail[self.head]
+            self.head += 1
+
+            watchers = self.watches[false_literal]
+            kept = []
+
+            for n, index in enumerate(watchers):
+                clause = self.clauses[index]
+                # Keep the false literal on the second watch position
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], clause[0]
+
+                # Clause is satisfied by the other watch, nothing to do
+                if clause[0] in true:
+                    kept.append(index)
+                    continue
+
+                # Look for a replacement watch that is not false
+                for k in range(2, len(clause)):
+                    if -clause[k] not in true:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches[clause[1]].append(index)
+                        break
+                else:
+                    kept.append(index)
+
+                    # No replacement: the clause is either unit or conflicting
+                    if -clause[0] in true:
+                        kept.extend(watchers[n + 1 :])
+                        self.watches[false_literal] = kept
+                        self.conflict = index
+                        return False
+
+                    self.assign(clause[0], index)
+
+            self.watches[false_literal] = kept
+
+        return True
+
+    def residual_cnf(self) -> CNFtype:
+        """Return the unsatisfied clauses without their false literals"""
+        if self._residual is not None:
+            return self._residual
+
+        true = self.true
+        if self.counted:
+            clauses = self.clauses
+            residual = [
+                {literal for literal in clauses[index] if -literal not in true}
+                for index in self.unsatisfied
+            ]
+        else:
+            residual = [
+                {literal for literal in clause if -literal not in true}
+                for clause in self.clauses
+                if clause is not None
+                and not any(literal in true for literal in clause)
+            ]
+
+        self._residual = residual
+
+        return residual
+
+    def pure_literals(self) -> Set[int]:
+        """Return unassigned literals whose negation is in no unsatisfied clause"""
+        if not self.counted:
+            unique_literals = set(chain.from_iterable(self.residual_cnf()))
+            return {ul for ul in unique_literals if -ul not in unique_literals}
+
+        # Counts include false literals, whose negation is true and not pure
+        true = self.true
+        literal_count = self.literal_count
+        pure_literals = {
+            -literal
+            for literal in self.pure_candidates
+            if literal_count[literal] == 0
+            and literal_count[-literal] > 0
+            and literal not in true
+        }
+        self.pure_candidates.clear()
+
+        return pure_literals
+
+    def free_variables(self) -> Set[int]:
+        """Unassigned variables of the unsatisfied clauses, which is all some
+        heuristics need of the residual cnf"""
+        if not self.counted:
+            residual = self.residual_cnf()
+            return {abs(literal) for clause in residual for literal in clause}
+
+        true = self.true
+        return {
+            abs(literal)
+            for literal, count in self.literal_count.items()
+            if count and literal not in true and -literal not in true
+        }
+
+    def is_satisfied(self) -> bool:
+        """All clauses are satisfied"""
+        if self.counted:
+            return not self.unsatisfied
+
+        return len(self.residual_cnf()) == 0
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from math import isqrt
+from multiprocessing import active_children, cpu_count
+from os import getpid, path, remove, stat
+from stat import S_ISSOCK
+from threading import Thread
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from .instrumentation import Metrics
+from .solvers import get_solver
+from .sudoku import Sudoku, get_encoder, load_rules
+from .utils import parse_dimacs, timed_solve
+
+Request = Dict[str, Any]
+Response = Dict[str, Any]
+
+# Requests carry a whole cnf on one line, far above the default of 64 KiB
+LINE_LIMIT = 1 << 28
+
+# Options of a request besides the cnf, with their defaults
+DEFAULTS: Request = dict(
+    solver="dpll",
+    heuristic="random",
+    engine="simplify",
+    backend="sets",
+    algorithm="probsat",
+    max_models=1,
+    timeout=None,
+    metrics=False,
+)
+
+
+class SolverServer:
+    """Long-running solver that answers requests given as JSON lines.
+
+    A request holds either `dimacs` text or a `sudoku` in a single line (the
+    grid size follows from its length unless `grid` is given), optionally
+    an `id` and any of the options in `DEFAULTS`. Every response repeats the
+    `id` and has a `status` of satisfied, unsatisfied, unknown (an incomplete
+    solver gave up), timeout or error. Satisfied responses contain the
+    `solution`, or the solved `grid` for a sudoku. Responses are written as
+    soon as they are solved, so not necessarily in order.
+
+    Requests are read with asyncio and solved by a pool of worker processes
+    that is started once. Every worker parses the rules of a grid once, the
+    ones in `rules` already when it starts.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        rules: Iterable[str] = ("9x9",),
+        defaults: Optional[Request] = None,
+    ) -> None:
+        self.workers = workers
+        self.rules = tuple(rules)
+        self.defaults = {**DEFAULTS, **(defaults or {})}
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> ProcessPoolExecutor:
+        """Start the worker processes, a broken pool is replaced"""
+        self.pool = ProcessPoolExecutor(
+            self.workers, initializer=init_worker, initargs=(self.rules,)
+        )
+        return self.pool
+
+    async def warm_up(self) -> None:
+        """Have every worker start and parse its rules before the first request"""
+        loop = asyncio.get_running_loop()
+        pool = self.pool or self.start()
+        workers = self.workers or cpu_count()
+        # Every task submitted while no worker is idle starts a new one
+        await asyncio.gather(
+            *(loop.run_in_executor(pool, getpid) for _ in range(workers))
+        )
+        print(f"Serving with {workers} workers", file=sys.stderr)
+
+    def close(self) -> None:
+        """Stop the workers, solves in progress are not waited for"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+        for process in active_children():
+            process.terminate()
+
+    async def handle(
+        self, line: bytes, write: Callable[[Response], Awaitable[None]]
+    ) -> None:
+        """Solve the request on a line in a worker and write its response"""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a json object")
+        except ValueError as error:
+            await write(dict(id=None, status="error", error=str(error)))
+            return
+
+        request = {**self.defaults, **request}
+        pool = self.pool or self.start()
+        loop = asyncio.get_running_loop()
+
+        try:
+            response = await loop.run_in_executor(pool, solve_request, request)
+        except BrokenProcessPool:
+            # A worker died, e.g. out of memory, the next requests get new ones
+            if self.pool is pool:
+                self.start()
+            response = dict(status="error", error="worker process died")
+
+        await write({"id": request.get("id"), **response})
+
+    async def serve_lines(
+        self,
+        readline: Callable[[], Awaitable[bytes]],
+        write: Callable[[Response], Awaitable[None]],
+    ) -> None:
+        """Handle every line concurrently until the end of the input, then
+        wait for the requests still being solved"""
+        pending = set()
+
+        while True:
+            line = await readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            task = asyncio.ensure_future(self.handle(line, write))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.wait(pending)
+
+    async def serve_stdin(self) -> None:
+        """Read requests from stdin and write responses to stdout"""
+        loop = asyncio.get_running_loop()
+        stop_on_signals(loop)
+        await self.warm_up()
+
+        lines: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+        def read() -> None:
+            # A thread also works for files and on Windows, unlike a pipe reader
+            try:
+                for line in sys.stdin.buffer:
+                    loop.call_soon_threadsafe(lines.put_nowait, line)
+                loop.call_soon_threadsafe(lines.put_nowait, b"")
+            except RuntimeError:
+                # The server stopped before the end of the input
+                ...
+
+        # As a daemon it doesn't keep the server from stopping while it reads
+        Thread(target=read, daemon=True).start()
+
+        async def write(response: Response) -> None:
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+
+        await self.serve_lines(lines.get, write)
+
+    async def serve_socket(self, socket_path: str) -> None:
+        """Accept any number of clients on a Unix socket, each sending requests
+        and receiving responses over its own connection"""
+        stop_on_signals(asyncio.get_running_loop())
+        await self.warm_up()
+
+        async def client(
+            reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ) -> None:
+            async def write(response: Response) -> None:
+                if writer.is_closing():
+                    return
+                writer.write(json.dumps(response).encode() + b"\n")
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    # The client is gone, its other responses are dropped
+                    ...
+
+            try:
+                await self.serve_lines(reader.readline, write)
+            except (ConnectionError, ValueError) as error:
+                # Lost connection or a line above the limit
+                await write(dict(id=None, status="error", error=str(error)))
+            except asyncio.CancelledError:
+                # The server stops, which is no error of the connection
+                ...
+            finally:
+                writer.close()
+
+        # A socket left behind by an earlier server that did not stop cleanly
+        if path.exists(socket_path) and S_ISSOCK(stat(socket_path).st_mode):
+            remove(socket_path)
+
+        server = await asyncio.start_unix_server(client, socket_path, limit=LINE_LIMIT)
+        print(f"Listening on {socket_path}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if path.exists(socket_path):
+                remove(socket_path)
+
+    def run(self, socket_path: Optional[str] = None) -> None:
+        """Serve on stdin until it ends, or on a socket until interrupted"""
+        try:
+            if socket_path is None:
+                asyncio.run(self.serve_stdin())
+            else:
+                asyncio.run(self.serve_socket(socket_path))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            ...
+        finally:
+            self.close()
+
+
+def stop_on_signals(loop: asyncio.AbstractEventLoop) -> None:
+    """Cancel the running task on Ctrl+C or SIGTERM, after which the workers
+    are stopped and the socket is removed"""
+    task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, task.cancel)
+        except NotImplementedError:
+            # Windows, where Ctrl+C still raises a KeyboardInterrupt
+            ...
+
+
+def init_worker(rules: Iterable[str]) -> None:
+    """Parse the rules once per process, `load_rules` keeps them"""
+    # Ctrl+C reaches the workers too, stopping them is left to the server,
+    # whose own handlers are not meant for the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    for grid in rules:
+        load_rules(grid, persist=True)
+
+
+def solve_request(request: Request) -> Response:
+    """Build the cnf and solver of a request and solve it, inside a worker"""
+    try:
+        cnf, encoder = load_request(request)
+        metrics = Metrics() if request["metrics"] else None
+        solver_class = get_solver(request["solver"])
+        solver = solver_class(cnf, metrics=metrics, **get_solver_kwargs(request))
+    except Exception as error:
+        return dict(status="error", error=f"{type(error).__name__}: {error}")
+
+    try:
+        finished = timed_solve(solver, request["timeout"])
+    except Exception as error:
+        return dict(status="error", error=f"{type(error).__name__}: {error}")
+
+    stats: Dict[str, Any] = dict(
+        backtracks=solver.backtrack_count,
+        propagations=solver.propagation_count,
+        duration=solver.solve_duration if finished else request["timeout"],
+    )
+    if not finished:
+        return dict(status="timeout", stats=stats)
+
+    if metrics is not None:
+        measured = metrics.as_dict().items()
+        stats.update({key: value for key, value in measured if value is not None})
+    if request["max_models"] != 1:
+        stats["models"] = len(solver.models)
+
+    if not solver.satisfied:
+        status = "unsatisfied" if solver.complete else "unknown"
+        return dict(status=status, stats=stats)
+
+    response: Response = dict(status="satisfied", stats=stats)
+    if encoder is not None:
+        response["grid"] = encoder.decode_grid(solver.solution)
+    else:
+        response["solution"] = sorted(solver.solution, key=abs)
+
+    return response
+
+
+def load_request(request: Request):
+    """The cnf of a request, with the encoder of its grid for a sudoku"""
+    if "dimacs" in request:
+        return parse_dimacs(request["dimacs"]), None
+
+    if "sudoku" not in request:
+        raise ValueError("a request needs either dimacs or a sudoku")
+
+    line = request["sudoku"].strip()
+    grid = request.get("grid")
+    if grid is None:
+        size = isqrt(len(line))
+        grid = f"{size}x{size}"
+
+    encoder = get_encoder(grid)
+    # Rules are parsed once per worker, only the givens are new
+    sudoku = Sudoku(encoder.encode_givens(line), grid, persist_rules=True)
+
+    return sudoku.get_all_clauses(), encoder
+
+
+def get_solver_kwargs(request: Request) -> Dict[str, Any]:
+    """Keyword arguments of the solver, as `SAT.py` builds them"""
+    solver = request["solver"]
+
+    kwargs: Dict[str, Any] = {}
+    if solver == "dpll":
+        kwargs = dict(
+            heuristic=request["heuristic"],
+            engine=request["engine"],
+            backend=request["backend"],
+        )
+    elif solver == "localsearch":
+        kwargs = dict(algorithm=request["algorithm"])
+    elif solver == "cubes":
+        kwargs = dict(
+            conquer_kwargs=dict(
+                heuristic=request["heuristic"],
+                engine=request["engine"],
+                backend=request["backend"],
+            )
+        )
+    if request["max_models"] != 1:
+        # 0 counts all models
+        if solver != "cdcl":
+            raise ValueError("counting models requires the cdcl solver")
+        kwargs["max_models"] = request["max_models"] or None
+
+    return kwargs
@@ -1,18 +1,57 @@
+import heapq
 import random
-from time import time
-from typing import Any, Callable, Counter, Iterable, List, Optional, Set, Tuple
-
+from time import perf_counter, time
+from typing import (
+    Any,
+    Callable,
+    Counter,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+from .database import ClauseDatabase
+from .heuristics import get_available_incremental_heuristics
+from .instrumentation import Metrics, print_progress
+from .lookahead import LookaheadCache, lookahead
+from .preprocessing import Preprocessor
+from .propagation import WatchedLiterals
 from .utils import CNFtype, flatten_list, neg_abs
+from .variables import VariableMap
 
 
 class Solver:
+    # Whether not satisfying the cnf means that it is unsatisfiable
+    complete = True
+
     def __init__(
-        self, cnf: CNFtype, verbose=False, identifier: Optional[Any] = None
+        self,
+        cnf: CNFtype,
+        verbose=False,
+        identifier: Optional[Any] = None,
+        metrics: Optional[Metrics] = None,
+        preprocess: bool = False,
     ) -> None:
-        self.cnf = cnf
+        # Solvers work on the variables renumbered to 1..n, the solution is
+        # translated back to the original variables after solving
+        self.variable_map = VariableMap(self.determine_literals(cnf))
+        self.cnf = self.variable_map.renumber(cnf)
         self.verbose = verbose
+        # Simplify the cnf before solving, see `Preprocessor`
+        self.preprocess = preprocess
+        self.preprocessor: Optional[Preprocessor] = None
+
+        # Verbose solvers print their progress every now and then
+        if metrics is None and verbose:
+            metrics = Metrics(progress=print_progress)
+        self.metrics = metrics
 
-        self.literals = self.determine_literals(cnf)
+        self.literals = set(range(1, len(self.variable_map) + 1))
         self.satisfied = False
         self.solution: Set[int] = set()
 
@@ -21,10 +60,24 @@ class Solver:
 
     def solve(self) -> None:
         """Kick off solving algorithm"""
+        if self.metrics is not None:
+            self.metrics.start()
+
+        # A solution of an earlier solve was restored already
+        self.solution = set()
+
         duration = time()
-        self.satisfied = self.start()
+        if self.preprocess:
+            self.satisfied = self.start_preprocessed()
+        else:
+            self.satisfied = self.start()
         duration = time() - duration
 
+        self.solution = self.variable_map.restore(self.solution)
+
+        if self.metrics is not None:
+            self.metrics.stop()
+
         self.solve_duration = duration
 
         if self.verbose:
@@ -37,6 +90,33 @@ class Solver:
         # NOTE: Implement this function in subclass
         raise NotImplementedError
 
+    def start_preprocessed(self) -> bool:
+        """Start on the preprocessed cnf, the solution is extended back to the
+        original cnf afterwards"""
+        cnf, literals = self.cnf, self.literals
+
+        self.preprocessor = Preprocessor(cnf)
+        self.cnf = self.preprocessor.run()
+        self.literals = self.determine_literals(self.cnf)
+
+        if self.verbose:
+            stats = self.preprocessor.stats
+            print(
+                f"Preprocessing removed "
+                f"{stats['clauses_before'] - stats['clauses_after']} clauses and "
+                f"{stats['variables_before'] - stats['variables_after']} variables"
+            )
+
+        try:
+            satisfied = self.start()
+        finally:
+            self.cnf, self.literals = cnf, literals
+
+        if satisfied:
+            self.set_solution(self.preprocessor.reconstruct(self.solution))
+
+        return satisfied
+
     def set_solution(self, solution: Iterable[int]):
         """Set the solution"""
         self.solution = set(solution)
@@ -206,6 +286,12 @@ class Solver:
 
         return max_lit
 
+    @classmethod
+    def get_literal_lookahead(cls, cnf: CNFtype) -> int:
+        """Lookahead, propagates the literals of the most promising variables
+        and picks the one reducing the cnf most on both sides."""
+        return lookahead(cnf)
+
     @staticmethod
     def determine_pure_literals(cnf: CNFtype) -> Set[int]:
         """Determine all pure literals"""
@@ -276,40 +362,121 @@ class DPLL(Solver):
         verbose: bool = False,
         identifier: Any = None,
         heuristic: str = "random",
+        engine: str = "simplify",
+        backend: str = "sets",
+        metrics: Optional[Metrics] = None,
+        preprocess: bool = False,
     ) -> None:
-        super().__init__(cnf, verbose=verbose, identifier=identifier)
+        super().__init__(
+            cnf,
+            verbose=verbose,
+            identifier=identifier,
+            metrics=metrics,
+            preprocess=preprocess,
+        )
+
+        engines = self.get_available_engines()
+        assert engine in engines, f"engine must be one of {engines}"
+        self.engine = engine
+
+        # The backend provides the cnf operations of the simplify engine
+        backends = self.get_available_backends()
+        assert backend in backends, f"backend must be one of {backends}"
+        assert engine == "simplify" or backend == "sets", "backends need simplify"
+        self.backend = self.get_backend(backend)
 
         # Determining this once saves a lot of it-statements and some computing power
-        self.get_literal, self.literal_post = self.get_heuristic_funcs(heuristic)
+        self.get_literal, self.literal_post = self.get_heuristic_funcs(
+            heuristic, engine
+        )
+        if self.get_literal is not None:
+            self.get_literal = getattr(self.backend, self.get_literal.__name__)
+        self.heuristic = heuristic.split("_")[0]
+        # Failed literals found by lookahead, kept per solve
+        self.lookahead: Optional[LookaheadCache] = None
 
     def start(self) -> bool:
         # Allows keeping count of backtracks and propagations
         self.backtrack_count = 0
         self.propagation_count = 0
 
-        return self.backtrack(self.cnf, partial_assignment=set())
+        if self.heuristic == "lookahead" and self.engine != "trail":
+            self.lookahead = LookaheadCache()
+
+        if self.engine == "watched":
+            return self.search(WatchedLiterals(self.cnf, counted=True))
+        if self.engine == "trail":
+            # The trail engine keeps the heuristic scores up to date itself
+            database = ClauseDatabase(self.cnf)
+            database.attach(get_available_incremental_heuristics()[self.heuristic]())
+            return self.search(database)
+
+        cnf = self.backend.convert(self.cnf)
 
-    def backtrack(self, cnf: CNFtype, partial_assignment: Set[int],) -> bool:
-        # Print some information every so often
-        if self.verbose and self.propagation_count % 10 == 0:
-            info_strings = [
-                f"{self.propagation_count:5} propagations",  # amount of function propagations
-                f"{self.backtrack_count:5} backtracks",  # amount of backtracks
-                f"{len(partial_assignment):5} assignment size",  # amount of assignments
-                f"{len(cnf):5} cnf size",  # length of unsolved cnf
-            ]
-            print(", ".join(info_strings))
+        return self.backtrack(cnf, partial_assignment=set())
+
+    @staticmethod
+    def get_available_engines() -> List[str]:
+        # `simplify` rebuilds the cnf at every step, the others assign in place
+        return ["simplify", "trail", "watched"]
+
+    @staticmethod
+    def get_available_backends() -> List[str]:
+        # `sets` works on a CNFtype, `numpy` on an array-backed CompactCNF and
+        # `bitset` on a BitsetCNF of int masks
+        return ["bitset", "numpy", "sets"]
+
+    @classmethod
+    def get_backend(cls, backend: str) -> Any:
+        """Return the class implementing the cnf operations of a backend"""
+        if backend == "numpy":
+            # Imported here as numpy is an optional requirement
+            from .compact import CompactBackend
+
+            return CompactBackend
+        if backend == "bitset":
+            # Imported here as the backend builds on Solver
+            from .bitset import BitsetBackend
+
+            return BitsetBackend
+
+        return cls
+
+    @staticmethod
+    def convert(cnf: CNFtype) -> CNFtype:
+        """Convert a cnf to the representation used by the `sets` backend"""
+        if isinstance(cnf, list):
+            return cnf
+        return [set(clause) for clause in cnf]
+
+    def backtrack(
+        self, cnf: CNFtype, partial_assignment: Set[int], depth: int = 0
+    ) -> bool:
+        # Metrics are only kept track of when asked for
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.visit(
+                depth,
+                len(cnf),  # length of unsolved cnf
+                propagations=self.propagation_count,  # amount of function propagations
+                backtracks=self.backtrack_count,  # amount of backtracks
+                assignment_size=len(partial_assignment),  # amount of assignments
+            )
+            start = perf_counter()
 
         # Increase propagation count
         self.propagation_count += 1
 
         # Simplify cnf
-        cnf, removed_literals = self.simplify(cnf)
+        cnf, removed_literals = self.backend.simplify(cnf)
         # Add removed literals from simplification
         partial_assignment = partial_assignment | removed_literals
 
+        if metrics is not None:
+            metrics.simplify_time += perf_counter() - start
+
         # Finish if cnf contains no clauses: satisfied
-        satisfied = self.check_satisfaction(cnf)
+        satisfied = self.backend.check_satisfaction(cnf)
         if satisfied is True:
             self.set_solution(partial_assignment)
             return True
@@ -317,32 +484,156 @@ class DPLL(Solver):
         if satisfied is False:
             # Keep the count of backtracks
             self.backtrack_count += 1
+            if metrics is not None:
+                metrics.conflicts += 1
             return False
         # Keep running if satisfied is None
 
+        if metrics is not None:
+            start = perf_counter()
+
         # Get a new split based on chosen heuristic
-        literal = self.get_literal(cnf)
+        literal = self.pick_literal(cnf, depth)
         # Do a post action if set
         if self.literal_post:
             literal = self.literal_post(literal)
 
-        # Try non-negation of the picked literal
-        satisfied = self.backtrack(
-            self.remove_literal(cnf, literal), partial_assignment | set([literal])
-        )
+        if metrics is not None:
+            metrics.heuristic_time += perf_counter() - start
+            metrics.decisions += 1
+
+        # Try non-negation of the picked literal, then the negated one
+        for branch in (literal, -literal):
+            if metrics is not None:
+                start = perf_counter()
+
+            branch_cnf = self.backend.remove_literal(cnf, branch)
+
+            if metrics is not None:
+                metrics.branch_time += perf_counter() - start
 
-        if not satisfied:
-            # Try negated picked value
             satisfied = self.backtrack(
-                self.remove_literal(cnf, -literal), partial_assignment | set([-literal])
+                branch_cnf, partial_assignment | set([branch]), depth + 1
             )
+            if satisfied:
+                break
 
         return satisfied
 
+    def pick_literal(self, cnf: CNFtype, level: int) -> int:
+        """Literal chosen by the heuristic, lookahead also gets the decision
+        level for its cache"""
+        if self.lookahead is not None:
+            return self.lookahead.pick(cnf, level)
+
+        return self.get_literal(cnf)
+
+    def search(self, engine: Union[ClauseDatabase, WatchedLiterals]) -> bool:
+        """Same search as `backtrack`, but as a loop over a single clause database.
+        Assignments are made in place and undone by popping the trail."""
+        # Decisions per level, with whether it already is the flipped branch
+        decisions: List[Tuple[int, bool]] = []
+
+        # Metrics are only kept track of when asked for
+        metrics = self.metrics
+        # Only the clause database keeps its heuristic up to date itself
+        incremental = isinstance(engine, ClauseDatabase)
+
+        while True:
+            if metrics is not None:
+                metrics.visit(
+                    engine.level,
+                    len(engine.unsatisfied),
+                    propagations=self.propagation_count,
+                    backtracks=self.backtrack_count,
+                    assignment_size=len(engine.trail),
+                )
+                start = perf_counter()
+
+            self.propagation_count += 1
+
+            # Unit propagation, repeated as long as pure literals are found
+            while True:
+                satisfied: Optional[bool] = None
+                if not engine.propagate():
+                    satisfied = False
+                    break
+                if engine.is_satisfied():
+                    satisfied = True
+                    break
+
+                pure_literals = engine.pure_literals()
+                if not pure_literals:
+                    break
+
+                for literal in pure_literals:
+                    engine.assign(literal)
+
+            if metrics is not None:
+                metrics.simplify_time += perf_counter() - start
+
+            if satisfied is True:
+                self.set_solution(engine.trail)
+                return True
+
+            if satisfied is False:
+                self.backtrack_count += 1
+
+                # Pop decisions of which both branches have been tried
+                while decisions and decisions[-1][1]:
+                    decisions.pop()
+                if not decisions:
+                    return False
+
+                if metrics is not None:
+                    metrics.conflicts += 1
+                    start = perf_counter()
+
+                # Flip the most recent decision
+                literal, _ = decisions.pop()
+                engine.backjump(len(decisions))
+                engine.new_level()
+                decisions.append((-literal, True))
+                engine.assign(-literal)
+
+                if metrics is not None:
+                    metrics.branch_time += perf_counter() - start
+                continue
+
+            # Get a new split based on chosen heuristic
+            if incremental and engine.heuristic is not None:
+                literal = engine.heuristic.pick()
+                if literal is None:
+                    # Lookahead assigned implied literals instead, which are
+                    # propagated and checked before the next decision
+                    continue
+            elif self.heuristic == "random":
+                # Only needs the variables that are left, not the clauses
+                literal = random.choice(sorted(engine.free_variables()))
+            else:
+                literal = self.pick_literal(engine.residual_cnf(), engine.level)
+            if self.literal_post:
+                literal = self.literal_post(literal)
+
+            if metrics is not None:
+                metrics.heuristic_time += perf_counter() - start
+                metrics.decisions += 1
+                start = perf_counter()
+
+            engine.new_level()
+            decisions.append((literal, False))
+            engine.assign(literal)
+
+            if metrics is not None:
+                metrics.branch_time += perf_counter() - start
+
     @classmethod
-    def get_available_heuristics(cls, post=True) -> List[str]:
+    def get_available_heuristics(cls, post=True, engine="simplify") -> List[str]:
         # Look up which `get_literal_...` functions are available
         heuristics = [h.split("_")[-1] for h in dir(cls) if h.startswith("get_literal")]
+        # The trail engine has incremental counterparts, some of which only exist there
+        if engine == "trail":
+            heuristics = list(get_available_incremental_heuristics())
         # To instantaneously triple the options offered a post action for every heuristic is possible
         # i.e. _neg makes sure the chosen literal is negated, _pos the opposite
         if post:
@@ -356,8 +647,10 @@ class DPLL(Solver):
         return heuristics
 
     @classmethod
-    def get_heuristic_funcs(cls, heuristic: str) -> Tuple[Callable, Optional[Callable]]:
-        heuristics = cls.get_available_heuristics()
+    def get_heuristic_funcs(
+        cls, heuristic: str, engine="simplify"
+    ) -> Tuple[Optional[Callable], Optional[Callable]]:
+        heuristics = cls.get_available_heuristics(engine=engine)
 
         # This checks whether the chosen heuristic is allowed
         assert heuristic in heuristics, f"heuristic must be one of {heuristics}"
@@ -365,8 +658,8 @@ class DPLL(Solver):
         # E.g. split "random_neg" into "random" and "neg", just "random" becomes "random" and None
         heuristic, *post = heuristic.split("_")
 
-        # Get the function to determine the literal
-        literal_func = getattr(cls, f"get_literal_{heuristic}")
+        # Get the function to determine the literal, incremental ones might not have one
+        literal_func = getattr(cls, f"get_literal_{heuristic}", None)
 
         # Determine the action to take after a literal is chosen
         post_func: Optional[Callable]
@@ -378,3 +671,435 @@ class DPLL(Solver):
             post_func = None
 
         return literal_func, post_func
+
+
+class CDCL(Solver):
+    def __init__(
+        self,
+        cnf: CNFtype,
+        verbose: bool = False,
+        identifier: Any = None,
+        restarts: Optional[str] = "luby",
+        restart_base: int = 100,
+        decay: float = 0.95,
+        metrics: Optional[Metrics] = None,
+        preprocess: bool = False,
+        max_models: Optional[int] = 1,
+        projection: Optional[Iterable[int]] = None,
+    ) -> None:
+        """Conflict driven clause learning. Conflicts are analysed up to the first
+        unique implication point, the learned clause decides how far to backjump.
+
+        With `max_models` other than 1 the search continues after a model, until
+        that many models are found (None for all of them). Models are counted on
+        the `projection` variables only, by default all variables of the cnf.
+        They are stored in `models`, `solution` is the first complete model."""
+        super().__init__(
+            cnf,
+            verbose=verbose,
+            identifier=identifier,
+            metrics=metrics,
+            preprocess=preprocess,
+        )
+
+        strategies = self.get_available_restarts()
+        assert restarts in strategies, f"restarts must be one of {strategies}"
+        self.restarts = restarts
+        self.restart_base = restart_base
+        self.decay = decay
+
+        assert max_models is None or max_models >= 1, "max_models must be positive"
+        assert max_models == 1 or not preprocess, "can't count preprocessed models"
+        self.max_models = max_models
+        self.projection = None
+        if projection is not None:
+            self.projection = set(map(abs, self.variable_map.to_dense(projection)))
+        self.models: List[Set[int]] = []
+        self.first_model: Set[int] = set()
+
+        # Built by the first solve and kept for the next ones
+        self.engine: Optional[WatchedLiterals] = None
+        self.assumptions: List[int] = []
+
+    @staticmethod
+    def get_available_restarts() -> List[Optional[str]]:
+        return ["luby", "geometric", None]
+
+    def solve(self, assumptions: Iterable[int] = ()) -> None:
+        """Solve with the assumptions holding for this solve only, e.g. the
+        givens of a sudoku on a cnf of just the rules.
+
+        The assumptions are taken as the first decisions, so nothing that is
+        learned depends on them. Learned clauses, activities and phases carry
+        over to the next solve, which does not read the cnf again."""
+        self.assumptions = self.variable_map.to_dense(assumptions)
+        # Preprocessing may have eliminated the variables of the assumptions
+        assert not (
+            self.assumptions and self.preprocess
+        ), "assumptions can't be combined with preprocessing"
+
+        super().solve()
+
+        # Only the models of this solve, start resets those of earlier ones
+        if self.models:
+            restore = self.variable_map.restore
+            self.models = [restore(model) for model in self.models]
+            self.first_model = restore(self.first_model)
+
+    def start(self) -> bool:
+        # Same counters as DPLL, a backtrack here is a backjump after a conflict
+        self.backtrack_count = 0
+        self.propagation_count = 0
+        self.decision_count = 0
+        self.restart_count = 0
+        self.learned_count = 0
+
+        # A preprocessed cnf differs per solve
+        if self.engine is None or self.preprocess:
+            self.setup()
+        else:
+            self.backjump(0)
+
+        self.models = []
+        self.first_model = set()
+        if self.max_models == 1:
+            assumptions = self.assumptions
+        else:
+            # Blocking clauses only hold while this variable is assumed true,
+            # it is left out of the restored solution
+            self.activation = self.variable_map.fresh()
+            assumptions = [self.activation, *self.assumptions]
+
+        # Variables that only occur in the assumptions
+        for literal in assumptions:
+            variable = abs(literal)
+            if variable not in self.activity:
+                self.activity[variable] = 0.0
+                self.phase[variable] = literal > 0
+
+        satisfied = self.search(assumptions)
+        if self.max_models == 1:
+            return satisfied
+
+        # Satisfies the blocking clauses and whatever was learned from them
+        self.backjump(0)
+        self.engine.add_clause([-self.activation])
+        self.engine.propagate()
+
+        if self.models:
+            self.set_solution(self.first_model)
+
+        return bool(self.models)
+
+    def setup(self) -> None:
+        """Load the cnf and reset what was learned"""
+        self.engine = WatchedLiterals(self.cnf)
+        self.learned: List[int] = []
+        self.max_learned = max(1000, len(self.cnf) // 3)
+
+        # VSIDS activities, kept in a heap of which outdated entries are skipped
+        self.activity = {variable: 0.0 for variable in self.literals}
+        self.activity_inc = 1.0
+        self.heap = [(0.0, variable) for variable in sorted(self.literals)]
+        # Phase saving, variables are tried false first
+        self.phase = {variable: False for variable in self.literals}
+
+    def search(self, assumptions: List[int]) -> bool:
+        engine = self.engine
+        restart_limit = self.next_restart_limit()
+        conflicts_since_restart = 0
+        # Metrics are only kept track of when asked for
+        metrics = self.metrics
+
+        while True:
+            self.propagation_count += 1
+
+            if metrics is not None:
+                metrics.visit(
+                    engine.level,
+                    len(engine.clauses),
+                    conflicts=self.backtrack_count,
+                    decisions=self.decision_count,
+                    restarts=self.restart_count,
+                    learned_clauses=len(self.learned),
+                )
+                start = perf_counter()
+
+            propagated = engine.propagate()
+
+            if metrics is not None:
+                metrics.simplify_time += perf_counter() - start
+
+            if not propagated:
+                self.backtrack_count += 1
+                conflicts_since_restart += 1
+
+                # A conflict without decisions can't be resolved, also not by
+                # any later solve
+                if engine.level == 0 or engine.conflict is None:
+                    engine.inconsistent = True
+                    return False
+
+                if metrics is not None:
+                    metrics.conflicts += 1
+                    start = perf_counter()
+
+                self.learn(engine.conflict)
+
+                if metrics is not None:
+                    metrics.branch_time += perf_counter() - start
+
+                continue
+
+            if restart_limit is not None and conflicts_since_restart >= restart_limit:
+                self.restart_count += 1
+                conflicts_since_restart = 0
+                restart_limit = self.next_restart_limit()
+                self.backjump(0)
+                continue
+
+            if len(self.learned) >= self.max_learned:
+                self.reduce_learned()
+
+            # Assumptions are decided first, one per level
+            if engine.level < len(assumptions):
+                literal = assumptions[engine.level]
+                value = engine.value(literal)
+                if value is False:
+                    return False
+
+                engine.new_level()
+                # An assumption that already holds gets an empty level
+                if value is None:
+                    engine.assign(literal)
+                continue
+
+            if metrics is not None:
+                start = perf_counter()
+
+            variable = self.pick_variable()
+            if variable is None:
+                self.set_solution(engine.trail)
+                if self.max_models == 1:
+                    return True
+
+                self.models.append(self.project(engine.trail))
+                if len(self.models) == 1:
+                    self.first_model = self.solution
+                if len(self.models) == self.max_models:
+                    return True
+
+                self.block(self.models[-1])
+                continue
+
+            if metrics is not None:
+                metrics.heuristic_time += perf_counter() - start
+                metrics.decisions += 1
+
+            self.decision_count += 1
+            engine.new_level()
+            engine.assign(variable if self.phase[variable] else -variable)
+
+    def learn(self, conflict: int) -> None:
+        """Analyse the conflict, backjump and assert the learned clause"""
+        engine = self.engine
+
+        learned, level = self.analyze(conflict)
+        self.backjump(level)
+
+        index = engine.add_clause(learned)
+        if len(learned) > 1:
+            self.learned.append(index)
+            engine.assign(learned[0], index)
+        self.learned_count += 1
+
+        self.activity_inc /= self.decay
+
+    def project(self, model: Iterable[int]) -> Set[int]:
+        """Restrict a model to the projection variables"""
+        if self.projection is None:
+            return {literal for literal in model if abs(literal) in self.literals}
+
+        return {literal for literal in model if abs(literal) in self.projection}
+
+    def block(self, model: Set[int]) -> None:
+        """Exclude the model by a clause that is conflicting right away, which
+        is resolved like any other conflict so the search continues from here"""
+        engine = self.engine
+        levels = engine.levels
+
+        # Highest levels first, as watching those keeps the watches valid
+        clause = sorted(
+            (-literal for literal in model), key=lambda l: -levels[abs(l)]
+        )
+        clause.append(-self.activation)
+
+        # Analysis starts from the level of the latest literal in the clause
+        self.backjump(max(levels[abs(literal)] for literal in clause))
+        self.learn(engine.add_clause(clause))
+
+    def analyze(self, conflict: int) -> Tuple[List[int], int]:
+        """Learn a clause from the conflict using the first unique implication
+        point. Returns the clause, asserting literal first, and the level to
+        backjump to."""
+        engine = self.engine
+        levels = engine.levels
+        level = engine.level
+
+        seen: Set[int] = set()
+        learned: List[int] = []
+        # Literals of the current level that still have to be resolved
+        pending = 0
+        literal = 0
+        index = len(engine.trail) - 1
+        clause = engine.clauses[conflict]
+
+        while True:
+            for other in clause:
+                variable = abs(other)
+                if other == literal or variable in seen or levels[variable] == 0:
+                    continue
+
+                seen.add(variable)
+                self.bump(variable)
+
+                if levels[variable] == level:
+                    pending += 1
+                else:
+                    learned.append(other)
+
+            # Walk back over the trail to the next literal to resolve on
+            while abs(engine.trail[index]) not in seen:
+                index -= 1
+            literal = engine.trail[index]
+            index -= 1
+            pending -= 1
+
+            if pending == 0:
+                break
+
+            clause = engine.clauses[engine.reasons[abs(literal)]]
+
+        if not learned:
+            return [-literal], 0
+
+        # Second watch goes to the literal that will be unassigned last
+        highest = max(range(len(learned)), key=lambda i: levels[abs(learned[i])])
+        learned[0], learned[highest] = learned[highest], learned[0]
+
+        return [-literal] + learned, levels[abs(learned[0])]
+
+    def backjump(self, level: int) -> None:
+        """Undo assignments above the level, saving phases of unassigned variables"""
+        engine = self.engine
+        if level >= engine.level:
+            return
+
+        for literal in engine.trail[engine.trail_lim[level] :]:
+            variable = abs(literal)
+            self.phase[variable] = literal > 0
+            heapq.heappush(self.heap, (-self.activity[variable], variable))
+
+        engine.backjump(level)
+
+    def bump(self, variable: int) -> None:
+        """Increase the activity of a variable involved in a conflict"""
+        self.activity[variable] += self.activity_inc
+
+        # Rescale to prevent floats from overflowing
+        if self.activity[variable] > 1e100:
+            for other in self.activity:
+                self.activity[other] *= 1e-100
+            self.activity_inc *= 1e-100
+            self.heap = [(-a, v) for v, a in self.activity.items()]
+            heapq.heapify(self.heap)
+        elif self.engine.value(variable) is None:
+            heapq.heappush(self.heap, (-self.activity[variable], variable))
+
+    def pick_variable(self) -> Optional[int]:
+        """Return the unassigned variable with the highest activity"""
+        heap = self.heap
+        engine = self.engine
+
+        while heap:
+            activity, variable = heap[0]
+            if engine.value(variable) is None and -activity == self.activity[variable]:
+                return variable
+            heapq.heappop(heap)
+
+        # Outdated entries might have hidden unassigned variables
+        unassigned = [v for v in self.activity if engine.value(v) is None]
+        if not unassigned:
+            return None
+
+        self.heap = [(-self.activity[v], v) for v in unassigned]
+        heapq.heapify(self.heap)
+
+        return self.heap[0][1]
+
+    def reduce_learned(self) -> None:
+        """Remove the less useful half of the learned clauses, which are the ones
+        spanning the most decision levels. Reasons of assignments are kept."""
+        engine = self.engine
+        levels = engine.levels
+
+        locked = {engine.reasons[abs(literal)] for literal in engine.trail}
+
+        def span(index: int) -> int:
+            clause = engine.clauses[index]
+            return len({levels.get(abs(literal), -1) for literal in clause})
+
+        candidates = [i for i in self.learned if i not in locked]
+        candidates.sort(key=span, reverse=True)
+        removed = set(i for i in candidates[: len(candidates) // 2] if span(i) > 2)
+
+        engine.remove_clauses(removed)
+        self.learned = [i for i in self.learned if i not in removed]
+        self.max_learned = int(self.max_learned * 1.1) + 1
+
+    def next_restart_limit(self) -> Optional[int]:
+        """Amount of conflicts before the next restart"""
+        if self.restarts == "luby":
+            return self.restart_base * luby(self.restart_count + 1)
+        if self.restarts == "geometric":
+            return int(self.restart_base * 1.5 ** self.restart_count)
+
+        return None
+
+
+def luby(i: int) -> int:
+    """The i-th element (starting at 1) of the Luby sequence 1 1 2 1 1 2 4 1 ..."""
+    k = 1
+    while True:
+        # i ends a subsequence, which ends with the highest power of two
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        # i lies in a repetition of the previous subsequence
+        if (1 << (k - 1)) <= i < (1 << k) - 1:
+            i -= (1 << (k - 1)) - 1
+            k = 1
+        else:
+            k += 1
+
+
+def get_solver(name: str) -> Type[Solver]:
+    """Return the solver class by its name"""
+    solvers = get_available_solvers()
+    assert name in solvers, f"solver must be one of {list(solvers)}"
+
+    return solvers[name]
+
+
+def get_available_solvers() -> Dict[str, Type[Solver]]:
+    # Imported here as these run the other solvers
+    from .cubes import CubeAndConquer
+    from .localsearch import LocalSearch
+    from .portfolio import Portfolio
+
+    return {
+        "cdcl": CDCL,
+        "cubes": CubeAndConquer,
+        "dpll": DPLL,
+        "localsearch": LocalSearch,
+        "portfolio": Portfolio,
+    }
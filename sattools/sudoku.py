@@ -1,23 +1,579 @@
-from os import path
-from typing import Union
+import re
+from array import array
+from functools import lru_cache
+from itertools import combinations
+from math import isqrt
+from os import path, stat
+from typing import (
+    TYPE_CHECKING,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from .utils import CNFtype, read_dimacs
 
+if TYPE_CHECKING:
+    from .compact import CompactCNF, SharedCNF
+
+RulesType = Tuple[FrozenSet[int], ...]
+
 
 class Sudoku:
-    def __init__(self, sudoku: Union[str, CNFtype], rules="9x9") -> None:
-        """Implements the Sudoku puzzle."""
-        self.base_rules = read_dimacs(filepath=self.get_rules_filepath(rules))
+    def __init__(
+        self,
+        sudoku: Union[str, CNFtype],
+        rules="9x9",
+        persist_rules=False,
+        preprocess=False,
+        shared_rules: Optional["SharedCNF"] = None,
+    ) -> None:
+        """Implements the Sudoku puzzle.
+
+        With `shared_rules` (see `sattools.compact.SharedCNF`) the rules are
+        not loaded by this process, the givens are applied to the shared
+        clauses instead. The solution then has to be completed with
+        `complete_solution`."""
+        self.rules = rules
+        self.shared_rules = shared_rules
+        # Shared between all puzzles with the same rules, never modify these
+        self.base_rules = None
+        if shared_rules is None:
+            self.base_rules = load_rules(rules, persist=persist_rules)
 
         if isinstance(sudoku, str):
             self.constraints = read_dimacs(filepath=sudoku)
         elif isinstance(sudoku, list):
             self.constraints = sudoku
 
+        # Set by `preprocess`, the clauses of the cells that are left
+        self.reduced_clauses: Optional[CNFtype] = None
+        self.fixed_count = 0
+        # Givens that are left out of the clauses
+        self.applied: Set[int] = set()
+
+        if preprocess:
+            self.preprocess()
+
     def get_rules_filepath(self, rules: str) -> str:
-        filepath = path.join(path.dirname(__file__), "sudoku_rules", f"{rules}.txt")
-        return filepath
+        return get_rules_filepath(rules)
+
+    def preprocess(self) -> int:
+        """Fill in the cells that follow from the givens by naked and hidden
+        singles and box-line reductions, after which the clauses only cover the
+        undecided cells. Returns the amount of cells fixed besides the givens."""
+        encoder = get_encoder(self.rules)
+        givens = [
+            next(iter(clause))
+            for clause in self.constraints
+            if len(clause) == 1 and next(iter(clause)) > 0
+        ]
+
+        # Only plain givens can be put on the grid, anything else needs the rules
+        if len(givens) != len(self.constraints):
+            return 0
+
+        grid = CandidateGrid(encoder)
+        for literal in givens:
+            grid.place(*encoder.decode(literal))
+        grid.reduce()
+
+        # An impossible puzzle is left to the solver to find out
+        if grid.contradiction:
+            return 0
+
+        self.reduced_clauses = grid.to_cnf()
+        self.fixed_count = grid.placed_count - len(givens)
+
+        return self.fixed_count
 
     def get_all_clauses(self) -> CNFtype:
-        """Return all clauses in the puzzle (rules + constraints + answers)."""
-        return self.base_rules + self.constraints
+        """Return all clauses in the puzzle (rules + constraints + answers).
+        The rule clauses are not copied, only the list referring to them.
+        With shared rules this is a CompactCNF that only has its own masks."""
+        if self.reduced_clauses is not None:
+            return self.reduced_clauses
+
+        if self.shared_rules is not None:
+            return self.get_shared_clauses()
+
+        return [*self.base_rules, *self.constraints]
+
+    def get_shared_clauses(self) -> Union[CNFtype, "CompactCNF"]:
+        """Apply the givens to the shared rules, which removes the clauses
+        they satisfy and their negations, but leaves the rules untouched"""
+        others = []
+        for clause in self.constraints:
+            if len(clause) == 1 and next(iter(clause)) > 0:
+                self.applied.add(next(iter(clause)))
+            else:
+                others.append(clause)
+
+        cnf = self.shared_rules.attach()
+        if self.applied:
+            cnf = cnf.remove_literals(self.applied)
+
+        if others:
+            return [*cnf, *others]
+
+        return cnf
+
+    def complete_solution(self, solution: Iterable[int]) -> Set[int]:
+        """Add the givens that were left out of the clauses to a solution. The
+        clauses of `preprocess` leave out the values that were ruled out, those
+        are added negated so the solution covers every variable either way."""
+        completed = set(solution) | self.applied
+        if self.reduced_clauses is None or not completed:
+            return completed
+
+        assigned = {abs(literal) for literal in completed}
+        for variable in get_encoder(self.rules).variables():
+            if variable not in assigned:
+                completed.add(-variable)
+
+        return completed
+
+
+class SudokuEncoder:
+    """Generates the rules of a sudoku for any box size, e.g. 5 for 25x25.
+
+    Variables are numbered densely by default, (row * size + column) * size
+    + value with zero-based rows and columns, so they run from 1 to size^3.
+    The `legacy` numbering matches the rule files in `sudoku_rules`: decimal
+    digits up to 9x9 (e.g. 123 for row 1, column 2, value 3) and base
+    size + 1 above that.
+
+    The `minimal` encoding only states that every cell has a value and that
+    no value repeats in a row, column or box. The `extended` encoding adds
+    that every cell has at most one value and every value occurs in each row,
+    column and box, which is what the rule files contain.
+    """
+
+    def __init__(
+        self, box_size: int, encoding: str = "minimal", numbering: str = "dense"
+    ) -> None:
+        encodings = self.get_available_encodings()
+        assert encoding in encodings, f"encoding must be one of {encodings}"
+        numberings = ["dense", "legacy"]
+        assert numbering in numberings, f"numbering must be one of {numberings}"
+
+        self.box_size = box_size
+        self.size = box_size ** 2
+        self.encoding = encoding
+        self.numbering = numbering
+
+        # Legacy numbering is positional with this base
+        self.base = 10 if self.size <= 9 else self.size + 1
+
+    @classmethod
+    def from_grid(cls, size: int, **kwargs) -> "SudokuEncoder":
+        """Encoder for a grid of size x size"""
+        box_size = isqrt(size)
+        assert box_size ** 2 == size, "the size of the grid must be a square"
+
+        return cls(box_size, **kwargs)
+
+    @staticmethod
+    def get_available_encodings() -> List[str]:
+        return ["extended", "minimal"]
+
+    @property
+    def n_variables(self) -> int:
+        return self.variable(self.size - 1, self.size - 1, self.size)
+
+    def variable(self, row: int, column: int, value: int) -> int:
+        """Variable for a value (1 to size) in a cell (zero-based)"""
+        if self.numbering == "legacy":
+            return ((row + 1) * self.base + column + 1) * self.base + value
+
+        return (row * self.size + column) * self.size + value
+
+    def variables(self) -> List[int]:
+        """Every cell/value variable, e.g. to project models on"""
+        values = range(1, self.size + 1)
+        cells = range(self.size)
+
+        return [self.variable(r, c, v) for r in cells for c in cells for v in values]
+
+    def decode(self, variable: int) -> Tuple[int, int, int]:
+        """Reverse of `variable`, returns row, column and value"""
+        if self.numbering == "legacy":
+            cell, value = divmod(variable, self.base)
+            row, column = divmod(cell, self.base)
+            return row - 1, column - 1, value
+
+        cell, value = divmod(variable - 1, self.size)
+        row, column = divmod(cell, self.size)
+        return row, column, value + 1
+
+    def units(self) -> Iterator[List[Tuple[int, int]]]:
+        """Every row, column and box as a list of cells"""
+        size, box = self.size, self.box_size
+
+        for i in range(size):
+            yield [(i, j) for j in range(size)]
+        for j in range(size):
+            yield [(i, j) for i in range(size)]
+        for box_row in range(0, size, box):
+            for box_column in range(0, size, box):
+                yield [
+                    (box_row + i, box_column + j)
+                    for i in range(box)
+                    for j in range(box)
+                ]
+
+    def iter_clauses(self) -> Iterator[Tuple[int, ...]]:
+        """Generate the clauses one by one, without keeping them in memory"""
+        size, var = self.size, self.variable
+        values = range(1, size + 1)
+        extended = self.encoding == "extended"
+
+        for row in range(size):
+            for column in range(size):
+                # Every cell has a value
+                yield tuple(var(row, column, value) for value in values)
+
+                # And at most one
+                if extended:
+                    for a, b in combinations(values, 2):
+                        yield (-var(row, column, a), -var(row, column, b))
+
+        for cells in self.units():
+            for value in values:
+                # No value occurs twice in a unit
+                for (i, j), (k, m) in combinations(cells, 2):
+                    yield (-var(i, j, value), -var(k, m, value))
+
+                # Every value occurs in every unit
+                if extended:
+                    yield tuple(var(i, j, value) for i, j in cells)
+
+    def clauses(self) -> CNFtype:
+        return [set(clause) for clause in self.iter_clauses()]
+
+    def write(self, filepath: str) -> None:
+        """Stream the rules to a DIMACS file"""
+        n_clauses = sum(1 for _ in self.iter_clauses())
+
+        with open(filepath, "w") as f:
+            f.write(f"p cnf {self.n_variables} {n_clauses}\n")
+            for clause in self.iter_clauses():
+                f.write(" ".join(map(str, clause)) + " 0\n")
+
+    def encode_givens(self, grid: str) -> CNFtype:
+        """Unit clauses for the filled in cells of a sudoku in a single line,
+        where `.` or `0` is an empty cell and values above 9 are letters"""
+        return [
+            {self.variable(row, column, value)}
+            for row, column, value in parse_sudoku_line(grid, self.size)
+        ]
+
+    def decode_grid(self, solution: Iterable[int]) -> str:
+        """Reverse of `encode_givens`, the cells set by the true literals of a
+        solution as a single line. Cells without a value are `.`"""
+        grid = ["."] * (self.size * self.size)
+
+        for literal in solution:
+            if literal <= 0:
+                continue
+
+            row, column, value = self.decode(literal)
+            if 0 <= row < self.size and 0 <= column < self.size:
+                if 1 <= value <= self.size:
+                    grid[row * self.size + column] = (
+                        str(value) if value <= 9 else chr(value + 55)
+                    )
+
+        return "".join(grid)
+
+
+class CandidateGrid:
+    """Sudoku grid with the candidate values of every cell as a bitmask, bit
+    `value - 1` being set while the value is still possible. Placing a value
+    removes it from the candidates of every cell sharing a row, column or box.
+    """
+
+    def __init__(self, encoder: SudokuEncoder) -> None:
+        self.encoder = encoder
+        self.size = size = encoder.size
+
+        # Cells are indexed row by row
+        self.units = [
+            [i * size + j for i, j in cells] for cells in encoder.units()
+        ]
+        self.peers: List[Set[int]] = [set() for _ in range(size * size)]
+        for unit in self.units:
+            for cell in unit:
+                self.peers[cell].update(unit)
+        for cell, peers in enumerate(self.peers):
+            peers.discard(cell)
+
+        # Boxes paired with the rows and columns crossing them, the units are
+        # in the order of `SudokuEncoder.units`
+        lines = self.units[: 2 * size]
+        boxes = self.units[2 * size :]
+        self.crossings = [
+            (set(box), set(line))
+            for box in boxes
+            for line in lines
+            if not set(box).isdisjoint(line)
+        ]
+
+        self.candidates = [(1 << size) - 1] * (size * size)
+        self.values = [0] * (size * size)
+        self.placed_count = 0
+        self.contradiction = False
+
+    def place(self, row: int, column: int, value: int) -> None:
+        cell = row * self.size + column
+        if self.values[cell] == value:
+            return
+
+        bit = 1 << (value - 1)
+        if self.values[cell] or not self.candidates[cell] & bit:
+            self.contradiction = True
+            return
+
+        self.values[cell] = value
+        self.candidates[cell] = bit
+        self.placed_count += 1
+
+        for peer in self.peers[cell]:
+            self.eliminate(peer, bit)
+
+    def eliminate(self, cell: int, bits: int) -> bool:
+        """Remove candidates from a cell, True if any were removed"""
+        if not self.candidates[cell] & bits:
+            return False
+
+        self.candidates[cell] &= ~bits
+        if not self.candidates[cell]:
+            self.contradiction = True
+
+        return True
+
+    def reduce(self) -> None:
+        """Apply the deductions until none of them changes the grid anymore"""
+        changed = True
+        while changed and not self.contradiction:
+            changed = self.naked_singles()
+            changed = self.hidden_singles() or changed
+            if not changed:
+                changed = self.box_line_reductions()
+
+    def naked_singles(self) -> bool:
+        """Place the cells that have a single candidate left"""
+        changed = False
+        for cell in range(len(self.candidates)):
+            candidates = self.candidates[cell]
+            if not self.values[cell] and candidates & (candidates - 1) == 0:
+                if not candidates:
+                    self.contradiction = True
+                    return False
+
+                self.place(*divmod(cell, self.size), candidates.bit_length())
+                changed = True
+
+        return changed
+
+    def hidden_singles(self) -> bool:
+        """Place values that fit in a single cell of a row, column or box"""
+        changed = False
+        for unit in self.units:
+            for value in range(1, self.size + 1):
+                bit = 1 << (value - 1)
+                cells = [cell for cell in unit if self.candidates[cell] & bit]
+
+                if not cells:
+                    self.contradiction = True
+                    return False
+                if len(cells) == 1 and not self.values[cells[0]]:
+                    self.place(*divmod(cells[0], self.size), value)
+                    changed = True
+
+        return changed
+
+    def box_line_reductions(self) -> bool:
+        """When the candidates for a value in a box all lie in one row or column,
+        the rest of that line cannot have the value, and the other way around"""
+        changed = False
+        for bit in (1 << value for value in range(self.size)):
+            for box, line in self.crossings:
+                changed = self.restrict(box, line, bit) or changed
+                changed = self.restrict(line, box, bit) or changed
+
+        return changed
+
+    def restrict(self, unit: Set[int], other: Set[int], bit: int) -> bool:
+        """If the undecided cells with a candidate in `unit` are all in `other`,
+        remove the candidate from the rest of `other`"""
+        cells = {
+            cell
+            for cell in unit
+            if not self.values[cell] and self.candidates[cell] & bit
+        }
+        if not cells or not cells.issubset(other):
+            return False
+
+        changed = False
+        for cell in other - unit:
+            changed = self.eliminate(cell, bit) or changed
+
+        return changed
+
+    def to_cnf(self) -> CNFtype:
+        """The decided cells as unit clauses, followed by the rules restricted
+        to the candidates of the undecided cells"""
+        size, variable = self.size, self.encoder.variable
+        extended = self.encoder.encoding == "extended"
+
+        def cell_variable(cell: int, value: int) -> int:
+            return variable(*divmod(cell, size), value)
+
+        def options(cell: int) -> List[int]:
+            candidates = self.candidates[cell]
+            return [v for v in range(1, size + 1) if candidates >> (v - 1) & 1]
+
+        cnf: CNFtype = [
+            {cell_variable(cell, value)}
+            for cell, value in enumerate(self.values)
+            if value
+        ]
+        undecided = [cell for cell, value in enumerate(self.values) if not value]
+
+        for cell in undecided:
+            cnf.append({cell_variable(cell, value) for value in options(cell)})
+            if extended:
+                for a, b in combinations(options(cell), 2):
+                    cnf.append({-cell_variable(cell, a), -cell_variable(cell, b)})
+
+        for unit in self.units:
+            for value in range(1, size + 1):
+                bit = 1 << (value - 1)
+                cells = [
+                    cell
+                    for cell in unit
+                    if not self.values[cell] and self.candidates[cell] & bit
+                ]
+
+                for a, b in combinations(cells, 2):
+                    cnf.append({-cell_variable(a, value), -cell_variable(b, value)})
+                if extended and cells:
+                    cnf.append({cell_variable(cell, value) for cell in cells})
+
+        return cnf
+
+
+def parse_sudoku_line(grid: str, size: int) -> List[Tuple[int, int, int]]:
+    """Row, column (zero-based) and value of every filled in cell"""
+    cells = []
+
+    for position, symbol in enumerate(grid.strip()[: size * size]):
+        if symbol in ".0":
+            continue
+
+        # 1 to 9, followed by A for 10, B for 11, etc.
+        value = int(symbol) if symbol.isdigit() else ord(symbol.upper()) - 55
+        assert 1 <= value <= size, f"invalid symbol {symbol} for a {size}x{size} grid"
+
+        row, column = divmod(position, size)
+        cells.append((row, column, value))
+
+    return cells
+
+
+def get_rules_filepath(rules: str) -> str:
+    filepath = path.join(path.dirname(__file__), "sudoku_rules", f"{rules}.txt")
+    return filepath
+
+
+@lru_cache(maxsize=None)
+def load_rules(rules: str, persist: bool = False) -> RulesType:
+    """Read the rules once per process, every later call returns the same clauses.
+
+    With `persist` the parsed rules are also stored as a binary file next to
+    the rules, which is read instead of the text as long as that is unchanged.
+    Rules without a file, e.g. `25x25`, are generated with dense numbering.
+    """
+    filepath = get_rules_filepath(rules)
+    if not path.exists(filepath):
+        return tuple(frozenset(clause) for clause in get_encoder(rules).iter_clauses())
+
+    binary_filepath = path.splitext(filepath)[0] + ".bin"
+    # Identifies the version of the text file the binary was made from
+    source = stat(filepath)
+    signature = [source.st_mtime_ns, source.st_size]
+
+    if persist:
+        try:
+            return read_rules_binary(binary_filepath, signature)
+        except (OSError, EOFError, ValueError):
+            # Missing or outdated, it gets (re)written below
+            ...
+
+    clauses = tuple(frozenset(clause) for clause in read_dimacs(filepath))
+
+    if persist:
+        try:
+            write_rules_binary(clauses, binary_filepath, signature)
+        except OSError:
+            # E.g. a read-only installation, the rules still work from memory
+            ...
+
+    return clauses
+
+
+def write_rules_binary(
+    clauses: Iterable[Iterable[int]], filepath: str, signature: List[int]
+) -> None:
+    """Write clauses as a flat array of int32 literals, 0 terminating a clause"""
+    literals = array("i")
+    for clause in clauses:
+        literals.extend(clause)
+        literals.append(0)
+
+    with open(filepath, "wb") as f:
+        array("q", signature + [len(literals)]).tofile(f)
+        literals.tofile(f)
+
+
+def read_rules_binary(filepath: str, signature: List[int]) -> RulesType:
+    """Read clauses written by `write_rules_binary`, if made from the same source"""
+    with open(filepath, "rb") as f:
+        header = array("q")
+        header.fromfile(f, 3)
+        if list(header[:2]) != signature:
+            raise ValueError("Binary rules are outdated")
+
+        literals = array("i")
+        literals.fromfile(f, header[2])
+
+    tokens = literals.tolist()
+    clauses = []
+    start = 0
+    while start < len(tokens):
+        end = tokens.index(0, start)
+        clauses.append(frozenset(tokens[start:end]))
+        start = end + 1
+
+    return tuple(clauses)
+
+
+def get_encoder(rules: str, encoding: Optional[str] = None) -> SudokuEncoder:
+    """Encoder with the numbering used for the rules, e.g. `9x9` or `25x25`.
+    Rules with a file use the legacy numbering and the extended encoding."""
+    match = re.fullmatch(r"(\d+)x\1", rules)
+    assert match, f"rules must be of the form NxN, not {rules}"
+    size = int(match.group(1))
+
+    if path.exists(get_rules_filepath(rules)):
+        return SudokuEncoder.from_grid(
+            size, encoding=encoding or "extended", numbering="legacy"
+        )
+
+    return SudokuEncoder.from_grid(size, encoding=encoding or "minimal")
@@ -1,28 +1,163 @@
+import bz2
+import gzip
+import lzma
+import signal
+import warnings
 from itertools import chain
 from os import mkdir, path
-from typing import Any, Iterable, List, Set
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Set
 
 CNFtype = List[Set[int]]
 
 
-def read_dimacs(filepath: str) -> CNFtype:
-    """Read a DIMACS file."""
-    with open(filepath, encoding="UTF-8") as f:
-        # Read the file and split by newlines into a list
-        dimacs_lines = f.read().splitlines()
+class DimacsReader:
+    """Streaming reader for (optionally compressed) DIMACS cnf files.
 
-    clause_list = []
-    for row in dimacs_lines:
-        if row[0] in ("c", "p"):
-            # Currently does nothing if the line is a comment
-            ...
+    The file is read in fixed-size chunks which are split on any whitespace,
+    so clauses may span lines and several clauses may share one. Tokens are
+    yielded as lists of ints in which 0 terminates a clause. The `p cnf`
+    header, when present, is stored and checked by `validate`; a mismatch is
+    a warning unless `strict` is set.
+    """
 
+    def __init__(
+        self, filepath: str, chunk_size: int = 1 << 20, strict: bool = False
+    ) -> None:
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.strict = strict
+
+        self.n_variables: Optional[int] = None
+        self.n_clauses: Optional[int] = None
+        # SATLIB files mark the end with a `%` line, anything after is ignored
+        self.finished = False
+
+    @staticmethod
+    def open(filepath: str) -> BinaryIO:
+        """Open a file for binary reading, decompressing .gz, .xz and .bz2"""
+        if filepath.endswith(".gz"):
+            return gzip.open(filepath, "rb")  # type: ignore
+        if filepath.endswith(".xz"):
+            return lzma.open(filepath, "rb")  # type: ignore
+        if filepath.endswith(".bz2"):
+            return bz2.open(filepath, "rb")  # type: ignore
+
+        return open(filepath, "rb")
+
+    def chunks(self) -> Iterator[List[int]]:
+        """Yield the literals and clause terminating zeros per chunk"""
+        remainder = b""
+
+        with self.open(self.filepath) as f:
+            while not self.finished:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+
+                # Only parse up to the last complete line, keep the rest
+                data = remainder + data
+                end = data.rfind(b"\n") + 1
+                data, remainder = data[:end], data[end:]
+
+                if data:
+                    yield self.parse(data)
+
+        if remainder and not self.finished:
+            yield self.parse(remainder)
+
+    def parse(self, data: bytes) -> List[int]:
+        """Parse complete lines into integers"""
+        # Fast path for chunks that only contain clauses
+        if not any(marker in data for marker in (b"c", b"p", b"%")):
+            tokens = data.split()
         else:
-            row = row.rstrip("0")  # Remove the trailing 0
-            row = row.strip()  # Remove leading and trailing spaces
-            clauses = row.split(" ")  # Split into statements
-            clauses_int = {int(i) for i in clauses}  # Convert to integers
-            clause_list.append(clauses_int)
+            tokens = []
+            for line in data.splitlines():
+                line = line.strip()
+                if not line or line.startswith(b"c"):
+                    continue
+                if line.startswith(b"p"):
+                    self.parse_header(line)
+                    continue
+                if line.startswith(b"%"):
+                    self.finished = True
+                    break
+                tokens.extend(line.split())
+
+        try:
+            return list(map(int, tokens))
+        except ValueError as error:
+            raise ValueError(f"Invalid DIMACS in {self.filepath}: {error}") from None
+
+    def parse_header(self, line: bytes) -> None:
+        """Parse the `p cnf <variables> <clauses>` line"""
+        parts = line.split()
+        if len(parts) != 4 or parts[1] != b"cnf":
+            raise ValueError(f"Invalid DIMACS header in {self.filepath}: {line!r}")
+
+        self.n_variables, self.n_clauses = int(parts[2]), int(parts[3])
+
+    def validate(self, n_clauses: int, max_variable: int) -> None:
+        """Check the amount of clauses and variables against the header"""
+        problems = []
+        if self.n_clauses is not None and n_clauses != self.n_clauses:
+            problems.append(f"{n_clauses} clauses instead of {self.n_clauses}")
+        if self.n_variables is not None and max_variable > self.n_variables:
+            problems.append(f"variable {max_variable} above {self.n_variables}")
+
+        if problems:
+            problem = ", ".join(problems)
+            message = f"{self.filepath} does not match its header: {problem}"
+            if self.strict:
+                raise ValueError(message)
+            warnings.warn(message)
+
+
+def read_dimacs(filepath: str, strict: bool = False) -> CNFtype:
+    """Read a DIMACS file, which may be compressed."""
+    reader = DimacsReader(filepath, strict=strict)
+
+    return collect_clauses(reader, reader.chunks())
+
+
+def parse_dimacs(text: str, strict: bool = False) -> CNFtype:
+    """Parse DIMACS given as a string instead of a file"""
+    reader = DimacsReader("<string>", strict=strict)
+
+    return collect_clauses(reader, [reader.parse(text.encode())])
+
+
+def collect_clauses(reader: DimacsReader, chunks: Iterable[List[int]]) -> CNFtype:
+    """Split the tokens of a reader into clauses and check them against the
+    header"""
+    clause_list = []
+    # Literals of a clause that continues in the next chunk
+    clause: List[int] = []
+    max_variable = 0
+
+    for tokens in chunks:
+        if not tokens:
+            continue
+        max_variable = max(max_variable, max(map(abs, tokens)))
+
+        start = 0
+        while True:
+            try:
+                end = tokens.index(0, start)
+            except ValueError:
+                clause.extend(tokens[start:])
+                break
+
+            clause.extend(tokens[start:end])
+            clause_list.append(set(clause))
+            clause = []
+            start = end + 1
+
+    # A last clause is allowed to miss its terminating 0
+    if clause:
+        clause_list.append(set(clause))
+
+    reader.validate(len(clause_list), max_variable)
 
     return clause_list
 
@@ -46,19 +181,13 @@ def read_sudoku_collections(filepath: str, size=9, write=False) -> List[CNFtype]
 
     Args:
         filepath (str): path to where file is.
-        size (int): size of the sudoku, default 9x9
+        size (int): size of the sudoku, default 9x9. Variables are numbered
+            like the rules of that size, see `sattools.sudoku.get_encoder`.
+        write (bool): also write every sudoku to its own DIMACS file.
 
     Returns:
-        a list of lists containing the dimacs rows as elements -> need another function to get them? 
-        or writing single DIMACS files?
+        a list with the starting positions of every sudoku as unit clauses.
     """
-
-    with open(filepath, encoding="UTF-8") as f:
-        # Read the file and split by newlines into a list
-        single_sudokus = f.read().splitlines()
-
-    sudoku_collection = []
-
     if write:
         write_dir = filepath.split(".")[0]
         try:
@@ -66,55 +195,9 @@ def read_sudoku_collections(filepath: str, size=9, write=False) -> List[CNFtype]
         except FileExistsError:
             pass
 
-    for num, row in enumerate(single_sudokus):
-
-        sudoku = []
-        # a list containing all starting positions in DIMACS as string
-
-        vals = list(row)
-
-        # not sure wether its row by row or column by column
-        # doesnt really matter tho, its just a transposition
-        # here its row by row
-        for i in range(0, size):
-            for j in range(0, size):
-
-                if vals[i * size + j] == ".":
-                    ...
-
-                else:
-
-                    if size == 16:
-
-                        if vals[i * size + j] in "ABCDEFG":
-                            if vals[i * size + j] == "A":
-                                vals[i * size + j] = "10"
-                            elif vals[i * size + j] == "B":
-                                vals[i * size + j] = "11"
-                            elif vals[i * size + j] == "C":
-                                vals[i * size + j] = "12"
-                            elif vals[i * size + j] == "D":
-                                vals[i * size + j] = "13"
-                            elif vals[i * size + j] == "E":
-                                vals[i * size + j] = "14"
-                            elif vals[i * size + j] == "F":
-                                vals[i * size + j] = "15"
-                            elif vals[i * size + j] == "G":
-                                vals[i * size + j] = "16"
-
-                        sudoku.append(
-                            {
-                                int(
-                                    (i + 1) * 289
-                                    + (j + 1) * 17
-                                    + int(vals[i * size + j])
-                                )
-                            }
-                        )
-
-                    else:
-                        sudoku.append({int(f"{i+1}{j+1}{vals[i*size + j]}")})
+    sudoku_collection = []
 
+    for num, sudoku in enumerate(iter_sudoku_collection(filepath, size)):
         sudoku_collection.append(sudoku)
 
         if write:
@@ -124,5 +207,46 @@ def read_sudoku_collections(filepath: str, size=9, write=False) -> List[CNFtype]
     return sudoku_collection
 
 
+def iter_sudoku_collection(filepath: str, size=9) -> Iterator[CNFtype]:
+    """Lazily read a collection of sudokus, one line at a time. Yields the
+    starting positions of every sudoku as unit clauses, row by row."""
+    # The encoder lives with the sudoku, which itself depends on this module
+    from .sudoku import get_encoder
+
+    encoder = get_encoder(f"{size}x{size}")
+
+    with open(filepath, encoding="UTF-8") as f:
+        for row in f:
+            yield encoder.encode_givens(row.rstrip("\r\n"))
+
+
 def neg_abs(x):
     return -abs(x)
+
+
+class SolveTimeout(Exception):
+    ...
+
+
+def timed_solve(solver: Any, timeout: Optional[float]) -> bool:
+    """Solve and return whether it finished within the timeout. The timeout
+    relies on SIGALRM, where that is missing (Windows) solves always finish."""
+    use_alarm = timeout is not None and hasattr(signal, "SIGALRM")
+
+    def alarm(*args):
+        raise SolveTimeout
+
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    try:
+        solver.solve()
+    except SolveTimeout:
+        return False
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    return True
@@ -0,0 +1,106 @@
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from .utils import CNFtype
+
+# Renumbered frozenset clauses, like the rules every sudoku shares, only for
+# the variables of the latest map
+_renumbered: Dict[Tuple[int, ...], Dict[FrozenSet[int], FrozenSet[int]]] = {}
+
+
+class VariableMap:
+    """Renumbering of the variables of a cnf to 1..n, in the order of the
+    original variables.
+
+    Encoders number their variables however suits them, like 111..999 for a
+    9x9 sudoku, so structures indexed by variable would be mostly empty.
+    Solvers work on the renumbered cnf and translate their solution back with
+    `restore`. Variables that are new to the map, e.g. in assumptions, are
+    numbered next. A solver may add variables of its own with `fresh`, which
+    are left out of restored solutions.
+    """
+
+    def __init__(self, variables: Iterable[int] = ()) -> None:
+        # Original variable of every dense one, 0 for those without
+        self.originals: List[int] = [0]
+        # Dense variable of every original one
+        self.dense: Dict[int, int] = {}
+        # Whether every variable keeps its number, so nothing is translated
+        self.identity = True
+
+        for variable in sorted(set(variables)):
+            self.add(variable)
+
+    @classmethod
+    def from_cnf(cls, cnf: Iterable[Iterable[int]]) -> "VariableMap":
+        return cls(abs(literal) for clause in cnf for literal in clause)
+
+    def add(self, variable: int) -> int:
+        """Dense variable of an original one, which is numbered next if new"""
+        if variable in self.dense:
+            return self.dense[variable]
+
+        index = len(self.originals)
+        self.originals.append(variable)
+        self.dense[variable] = index
+        self.identity = self.identity and variable == index
+
+        return index
+
+    def fresh(self) -> int:
+        """A dense variable without an original one"""
+        self.originals.append(0)
+        self.identity = False
+
+        return len(self.originals) - 1
+
+    def renumber(self, cnf: CNFtype) -> CNFtype:
+        """The cnf over the dense variables, which are all in the map"""
+        if self.identity:
+            return cnf
+        if hasattr(cnf, "renumber"):
+            # Array-backed cnfs translate all their literals at once
+            return cnf.renumber(self)  # type: ignore
+
+        key = tuple(self.originals)
+        if key not in _renumbered:
+            _renumbered.clear()
+            _renumbered[key] = {}
+        cache = _renumbered[key]
+
+        dense = self.dense
+        clauses = []
+        for clause in cnf:
+            if not isinstance(clause, frozenset):
+                clauses.append({dense[l] if l > 0 else -dense[-l] for l in clause})
+                continue
+
+            renumbered = cache.get(clause)
+            if renumbered is None:
+                renumbered = cache[clause] = frozenset(
+                    dense[l] if l > 0 else -dense[-l] for l in clause
+                )
+            clauses.append(renumbered)
+
+        return clauses
+
+    def to_dense(self, literals: Iterable[int]) -> List[int]:
+        """Dense literals of original ones, adding the variables that are new"""
+        add = self.add
+        return [add(literal) if literal > 0 else -add(-literal) for literal in literals]
+
+    def restore(self, literals: Iterable[int]) -> Set[int]:
+        """Original literals of dense ones, without the fresh variables"""
+        if self.identity:
+            return set(literals)
+
+        originals = self.originals
+        restored = set()
+        for literal in literals:
+            variable = originals[abs(literal)]
+            if variable:
+                restored.add(variable if literal > 0 else -variable)
+
+        return restored
+
+    def __len__(self) -> int:
+        return len(self.originals) - 1